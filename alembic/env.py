@@ -3,7 +3,8 @@ from logging.config import fileConfig
 from sqlalchemy import engine_from_config, pool
 
 from alembic import context
-from server.models import DSN, Base
+from server.config import DSN
+from server.models import Base
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,45 @@
+"""Sync tombstones
+
+Revision ID: 32c88a89244e
+Revises: 33a5d57fcd80
+Create Date: 2026-10-19 11:31:02.415806
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "32c88a89244e"
+down_revision: Union[str, None] = "33a5d57fcd80"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "Tombstone",
+        sa.Column("id", sa.BigInteger(), nullable=False),
+        sa.Column("model", sa.String(length=50), nullable=False),
+        sa.Column("object_id", sa.Integer(), nullable=False),
+        sa.Column("deleted_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_Tombstone_deleted_at"), "Tombstone", ["deleted_at"], unique=False)
+
+    op.add_column("User", sa.Column("updated_at", sa.DateTime(), nullable=True))
+    op.execute('UPDATE "User" SET updated_at = registered_at')
+    op.alter_column("User", "updated_at", server_default=sa.text("now()"), nullable=False)
+    op.create_index(op.f("ix_User_updated_at"), "User", ["updated_at"], unique=False)
+    op.create_index("ix_Advertisement_updated_at", "Advertisement", ["updated_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_Advertisement_updated_at", table_name="Advertisement")
+    op.drop_index(op.f("ix_User_updated_at"), table_name="User")
+    op.drop_column("User", "updated_at")
+    op.drop_index(op.f("ix_Tombstone_deleted_at"), table_name="Tombstone")
+    op.drop_table("Tombstone")
@@ -0,0 +1,39 @@
+"""User deletion requested at
+
+Revision ID: 33a5d57fcd80
+Revises: 9e489ea5b191
+Create Date: 2026-10-19 11:17:40.095363
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "33a5d57fcd80"
+down_revision: Union[str, None] = "9e489ea5b191"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("User", sa.Column("deletion_requested_at", sa.DateTime(), nullable=True))
+    op.create_index(
+        "ix_User_deletion_requested_at",
+        "User",
+        ["deletion_requested_at"],
+        unique=False,
+        postgresql_where=sa.text("deletion_requested_at IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_User_deletion_requested_at",
+        table_name="User",
+        postgresql_where=sa.text("deletion_requested_at IS NOT NULL"),
+    )
+    op.drop_column("User", "deletion_requested_at")
@@ -0,0 +1,49 @@
+"""User stats
+
+Revision ID: 7b9179b117c2
+Revises: 385ab5ac771f
+Create Date: 2026-10-19 10:24:18.742832
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7b9179b117c2"
+down_revision: Union[str, None] = "385ab5ac771f"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "UserStats",
+        sa.Column("id_user", sa.Integer(), nullable=False),
+        sa.Column("advertisements_count", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("first_posted_at", sa.DateTime(), nullable=True),
+        sa.Column("last_posted_at", sa.DateTime(), nullable=True),
+        sa.Column("last_updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["id_user"], ["User.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id_user"),
+    )
+    op.create_index(
+        "ix_Advertisement_id_user_created_at",
+        "Advertisement",
+        ["id_user", "created_at"],
+        unique=False,
+    )
+    op.execute(
+        'INSERT INTO "UserStats" '
+        "(id_user, advertisements_count, first_posted_at, last_posted_at, last_updated_at) "
+        "SELECT id_user, count(*), min(created_at), max(created_at), max(updated_at) "
+        'FROM "Advertisement" GROUP BY id_user'
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_Advertisement_id_user_created_at", table_name="Advertisement")
+    op.drop_table("UserStats")
@@ -0,0 +1,76 @@
+"""Advertisement title created at
+
+Revision ID: 9e489ea5b191
+Revises: f7f916cdf3bc
+Create Date: 2026-10-19 11:13:50.060307
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9e489ea5b191"
+down_revision: Union[str, None] = "f7f916cdf3bc"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Заголовок может быть заранее зарезервирован для объявления с тем же идентификатором
+# (массовая загрузка), поэтому конфликт с такой записью не является ошибкой.
+TITLE_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION advertisement_title_sync()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO "AdvertisementTitle" (title, id_advertisement, created_at)
+        VALUES (NEW.title, NEW.id, NEW.created_at)
+        ON CONFLICT (title) DO UPDATE SET created_at = EXCLUDED.created_at
+        WHERE "AdvertisementTitle".id_advertisement = EXCLUDED.id_advertisement;
+        IF NOT FOUND THEN
+            RAISE unique_violation USING
+                MESSAGE = format('duplicate advertisement title %L', NEW.title),
+                CONSTRAINT = 'AdvertisementTitle_pkey';
+        END IF;
+    ELSIF TG_OP = 'UPDATE' THEN
+        UPDATE "AdvertisementTitle" SET title = NEW.title WHERE title = OLD.title;
+    ELSE
+        DELETE FROM "AdvertisementTitle" WHERE title = OLD.title;
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+OLD_TITLE_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION advertisement_title_sync()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO "AdvertisementTitle" (title, id_advertisement) VALUES (NEW.title, NEW.id);
+    ELSIF TG_OP = 'UPDATE' THEN
+        UPDATE "AdvertisementTitle" SET title = NEW.title WHERE title = OLD.title;
+    ELSE
+        DELETE FROM "AdvertisementTitle" WHERE title = OLD.title;
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+
+def upgrade() -> None:
+    op.add_column("AdvertisementTitle", sa.Column("created_at", sa.DateTime(), nullable=True))
+    op.execute(
+        'UPDATE "AdvertisementTitle" t SET created_at = a.created_at '
+        'FROM "Advertisement" a WHERE a.id = t.id_advertisement'
+    )
+    op.alter_column("AdvertisementTitle", "created_at", nullable=False)
+    op.execute(TITLE_TRIGGER_FUNCTION)
+
+
+def downgrade() -> None:
+    op.execute(OLD_TITLE_TRIGGER_FUNCTION)
+    op.drop_column("AdvertisementTitle", "created_at")
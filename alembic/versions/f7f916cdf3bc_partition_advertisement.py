@@ -0,0 +1,185 @@
+"""Partition advertisement
+
+Revision ID: f7f916cdf3bc
+Revises: 20d7965e3cb2
+Create Date: 2026-10-19 10:36:41.211903
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f7f916cdf3bc"
+down_revision: Union[str, None] = "20d7965e3cb2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CREATE_PARTITION_FUNCTION = """
+CREATE OR REPLACE FUNCTION advertisement_create_partition(month timestamp)
+RETURNS boolean LANGUAGE plpgsql AS $$
+DECLARE
+    start_time timestamp := date_trunc('month', month);
+    end_time timestamp := date_trunc('month', month) + interval '1 month';
+    partition_name text := 'Advertisement_' || to_char(start_time, 'YYYY_MM');
+BEGIN
+    IF to_regclass(quote_ident(partition_name)) IS NOT NULL THEN
+        RETURN false;
+    END IF;
+    EXECUTE format(
+        'CREATE TABLE %I PARTITION OF "Advertisement" FOR VALUES FROM (%L) TO (%L)',
+        partition_name, start_time, end_time
+    );
+    RETURN true;
+END
+$$
+"""
+
+ENSURE_PARTITIONS_FUNCTION = """
+CREATE OR REPLACE FUNCTION advertisement_ensure_partitions(
+    months_ahead integer, since timestamp DEFAULT now()::timestamp
+)
+RETURNS integer LANGUAGE sql AS $$
+    SELECT (count(*) FILTER (WHERE advertisement_create_partition(month)))::integer
+    FROM generate_series(
+        date_trunc('month', since),
+        date_trunc('month', now()::timestamp) + make_interval(months => months_ahead),
+        interval '1 month'
+    ) AS month
+$$
+"""
+
+TITLE_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION advertisement_title_sync()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO "AdvertisementTitle" (title, id_advertisement) VALUES (NEW.title, NEW.id);
+    ELSIF TG_OP = 'UPDATE' THEN
+        UPDATE "AdvertisementTitle" SET title = NEW.title WHERE title = OLD.title;
+    ELSE
+        DELETE FROM "AdvertisementTitle" WHERE title = OLD.title;
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        "AdvertisementTitle",
+        sa.Column("title", sa.String(length=50), nullable=False),
+        sa.Column("id_advertisement", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("title"),
+    )
+    op.create_index(
+        op.f("ix_AdvertisementTitle_id_advertisement"),
+        "AdvertisementTitle",
+        ["id_advertisement"],
+        unique=False,
+    )
+
+    op.rename_table("Advertisement", "Advertisement_old")
+    op.execute('ALTER INDEX "Advertisement_pkey" RENAME TO "Advertisement_old_pkey"')
+    op.execute('ALTER INDEX "Advertisement_title_key" RENAME TO "Advertisement_old_title_key"')
+    op.execute(
+        'ALTER INDEX "ix_Advertisement_id_user_created_at" '
+        'RENAME TO "ix_Advertisement_old_id_user_created_at"'
+    )
+    op.execute(
+        'ALTER TABLE "Advertisement_old" '
+        'RENAME CONSTRAINT "Advertisement_id_user_fkey" TO "Advertisement_old_id_user_fkey"'
+    )
+
+    op.create_table(
+        "Advertisement",
+        sa.Column(
+            "id",
+            sa.Integer(),
+            server_default=sa.text("nextval('\"Advertisement_id_seq\"'::regclass)"),
+            nullable=False,
+        ),
+        sa.Column("id_user", sa.Integer(), nullable=False),
+        sa.Column("title", sa.String(length=50), nullable=False),
+        sa.Column("text", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+        sa.ForeignKeyConstraint(["id_user"], ["User.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id", "created_at"),
+        postgresql_partition_by="RANGE (created_at)",
+    )
+    op.create_index(
+        "ix_Advertisement_id_user_created_at",
+        "Advertisement",
+        ["id_user", "created_at"],
+        unique=False,
+    )
+    op.execute(CREATE_PARTITION_FUNCTION)
+    op.execute(ENSURE_PARTITIONS_FUNCTION)
+    op.execute(
+        "SELECT advertisement_ensure_partitions(3, "
+        '(SELECT coalesce(min(created_at), now()::timestamp) FROM "Advertisement_old"))'
+    )
+
+    op.execute(
+        'INSERT INTO "Advertisement" (id, id_user, title, text, created_at, updated_at) '
+        'SELECT id, id_user, title, text, created_at, updated_at FROM "Advertisement_old"'
+    )
+    op.execute(
+        'INSERT INTO "AdvertisementTitle" (title, id_advertisement) '
+        'SELECT title, id FROM "Advertisement_old"'
+    )
+    op.execute(TITLE_TRIGGER_FUNCTION)
+    op.execute(
+        "CREATE TRIGGER advertisement_title_sync "
+        'AFTER INSERT OR UPDATE OF title OR DELETE ON "Advertisement" '
+        "FOR EACH ROW EXECUTE FUNCTION advertisement_title_sync()"
+    )
+
+    op.execute('ALTER SEQUENCE "Advertisement_id_seq" OWNED BY "Advertisement".id')
+    op.drop_table("Advertisement_old")
+
+
+def downgrade() -> None:
+    op.execute('ALTER SEQUENCE "Advertisement_id_seq" OWNED BY NONE')
+    op.execute('CREATE TABLE "Advertisement_old" AS SELECT * FROM "Advertisement"')
+    op.drop_table("Advertisement")
+    op.execute("DROP FUNCTION advertisement_title_sync()")
+    op.execute("DROP FUNCTION advertisement_ensure_partitions(integer, timestamp)")
+    op.execute("DROP FUNCTION advertisement_create_partition(timestamp)")
+    op.drop_index(op.f("ix_AdvertisementTitle_id_advertisement"), table_name="AdvertisementTitle")
+    op.drop_table("AdvertisementTitle")
+
+    op.rename_table("Advertisement_old", "Advertisement")
+    op.execute(
+        'ALTER TABLE "Advertisement" '
+        "ALTER COLUMN id SET DEFAULT nextval('\"Advertisement_id_seq\"'::regclass), "
+        "ALTER COLUMN created_at SET DEFAULT now(), "
+        "ALTER COLUMN updated_at SET DEFAULT now(), "
+        "ALTER COLUMN id_user SET NOT NULL, "
+        "ALTER COLUMN title SET NOT NULL, "
+        "ALTER COLUMN text SET NOT NULL, "
+        "ALTER COLUMN created_at SET NOT NULL, "
+        "ALTER COLUMN updated_at SET NOT NULL"
+    )
+    op.execute('ALTER SEQUENCE "Advertisement_id_seq" OWNED BY "Advertisement".id')
+    op.create_primary_key("Advertisement_pkey", "Advertisement", ["id"])
+    op.create_unique_constraint("Advertisement_title_key", "Advertisement", ["title"])
+    op.create_foreign_key(
+        "Advertisement_id_user_fkey",
+        "Advertisement",
+        "User",
+        ["id_user"],
+        ["id"],
+        ondelete="CASCADE",
+    )
+    op.create_index(
+        "ix_Advertisement_id_user_created_at",
+        "Advertisement",
+        ["id_user", "created_at"],
+        unique=False,
+    )
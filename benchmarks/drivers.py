@@ -0,0 +1,156 @@
+"""Сравнение драйверов PostgreSQL на частых запросах приложения.
+
+Режимы:
+    psycopg2 - текущий драйвер;
+    psycopg - psycopg 3 без подготовленных запросов;
+    psycopg-prepared - psycopg 3, запросы подготавливаются на сервере после 5 выполнений;
+    psycopg-binary - то же с результатами в двоичном формате.
+
+Запросы выполняются в одном соединении, как в потоке воркера:
+    get-user - session.get(User, id), как при проверке токена;
+    login - поиск пользователя по имени, как в /login;
+    list - страница из 50 объявлений, как GET /advertisement?limit=50;
+    write - изменение объявления с учетом статистики и NOTIFY, как PATCH /advertisement/id
+        (для psycopg 3 - в режиме pipeline), с откатом транзакции.
+
+Запуск из корня проекта: python -m benchmarks.drivers [--iterations N] [--latency MS].
+--latency направляет соединения через локальный прокси, задерживающий каждую
+передачу данных на MS миллисекунд, как сеть между приложением и базой данных.
+"""
+
+import argparse
+import queue
+import socket
+import statistics
+import threading
+import time
+from collections.abc import Callable
+
+import sqlalchemy as sq
+
+from server import events, stats
+from server.config import DSN
+from server.models import Advertisement, Database, User, pipeline
+
+MODES = {
+    "psycopg2": ("postgresql+psycopg2", {}),
+    "psycopg": ("postgresql+psycopg", {"connect_args": {"prepare_threshold": None}}),
+    "psycopg-prepared": ("postgresql+psycopg", {"connect_args": {"prepare_threshold": 5}}),
+    "psycopg-binary": (
+        "postgresql+psycopg",
+        {"connect_args": {"prepare_threshold": 5}, "binary_results": True},
+    ),
+}
+
+
+def _workloads(session: sq.orm.Session) -> dict[str, Callable[[], None]]:
+    user: User = session.scalars(sq.select(User).order_by(User.id).limit(1)).one()
+    user_id, username = user.id, user.username
+    advertisement_id = session.scalar(sq.select(sq.func.max(Advertisement.id)))
+    session.rollback()
+
+    def get_user() -> None:
+        session.get(User, user_id)
+        session.expunge_all()
+
+    def login() -> None:
+        session.scalar(sq.select(User).where(User.username == username))
+        session.expunge_all()
+
+    def list_page() -> None:
+        query = sq.select(Advertisement).order_by(Advertisement.id).limit(50)
+        [advertisement.as_dict for advertisement in session.scalars(query)]
+        session.expunge_all()
+
+    def write() -> None:
+        advertisement = session.get(Advertisement, advertisement_id)
+        advertisement.text = f"{advertisement.text[:100]} {time.monotonic()}"
+        session.flush()
+        payload = events.prepare(session, "updated", advertisement)
+        with pipeline(session):
+            stats.advertisement_updated(session, advertisement)
+            events.publish(session, payload)
+        session.rollback()
+
+    return {"get-user": get_user, "login": login, "list": list_page, "write": write}
+
+
+def _forward(source: socket.socket, target: socket.socket, delay: float) -> None:
+    """Передача данных с задержкой: данные в пути не задерживают друг друга."""
+    chunks: queue.SimpleQueue = queue.SimpleQueue()
+
+    def send() -> None:
+        while (chunk := chunks.get()) is not None:
+            time.sleep(max(0.0, chunk[0] - time.monotonic()))
+            target.sendall(chunk[1])
+
+    sender = threading.Thread(target=send, daemon=True)
+    sender.start()
+    with source, target:
+        while data := source.recv(65536):
+            chunks.put((time.monotonic() + delay, data))
+        chunks.put(None)
+        sender.join()
+
+
+def _start_proxy(host: str, port: int, delay: float) -> int:
+    """Запуск прокси с задержкой передачи данных. Возвращает локальный порт."""
+    listener = socket.create_server(("127.0.0.1", 0))
+
+    def accept() -> None:
+        while True:
+            client, _ = listener.accept()
+            server = socket.create_connection((host, port))
+            for connection in (client, server):
+                connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            for source, target in ((client, server), (server, client)):
+                thread = threading.Thread(target=_forward, args=(source, target, delay))
+                thread.daemon = True
+                thread.start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    return listener.getsockname()[1]
+
+
+def _measure(function: Callable[[], None], iterations: int) -> float:
+    """Медиана времени выполнения в микросекундах после прогрева."""
+    for _ in range(min(iterations, 50)):
+        function()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1_000_000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0, help="Задержка сети, мс.")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    args = parser.parse_args()
+
+    url = sq.make_url(DSN)
+    if args.latency:
+        port = _start_proxy(url.host, url.port or 5432, args.latency / 1000)
+        url = url.set(host="127.0.0.1", port=port)
+    results: dict[str, dict[str, float]] = {}
+    for mode in args.modes:
+        drivername, options = MODES[mode]
+        database = Database(url.set(drivername=drivername).render_as_string(False), **options)
+        with database() as session:
+            results[mode] = {
+                name: _measure(function, args.iterations)
+                for name, function in _workloads(session).items()
+            }
+        database.dispose()
+
+    names = list(next(iter(results.values())))
+    print(f"{'mode':<18}" + "".join(f"{name:>12}" for name in names) + "   (median, µs)")
+    for mode, timings in results.items():
+        print(f"{mode:<18}" + "".join(f"{timings[name]:>12.0f}" for name in names))
+
+
+if __name__ == "__main__":
+    main()
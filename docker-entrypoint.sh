@@ -2,6 +2,7 @@
 
 echo "Make database migrations"
 alembic upgrade head
+flask --app server partitions create
 
 echo "Starting server"
-gunicorn -w 3 wsgi:app -b unix:/app/socket/wsgi.socket
\ No newline at end of file
+gunicorn -c gunicorn.conf.py wsgi:app
\ No newline at end of file
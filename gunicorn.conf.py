@@ -0,0 +1,100 @@
+"""Конфигурация gunicorn для production-запуска.
+
+Приложение загружается в мастер-процессе один раз (preload_app), после чего
+воркеры получают его через fork и разделяют память по принципу copy-on-write.
+Все параметры можно переопределить переменными окружения GUNICORN_*.
+"""
+
+import gc
+import os
+
+
+def _cpu_count() -> int:
+    """Количество доступных процессу ядер с учетом ограничений контейнера."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+CPU_COUNT = _cpu_count()
+
+bind = os.getenv("GUNICORN_BIND") or "unix:/app/socket/wsgi.socket"
+
+# gthread-воркеры обслуживают запросы пулом потоков: при ожидании ответа базы данных
+# процесс продолжает обрабатывать другие запросы, поэтому процессов нужно меньше.
+worker_class = os.getenv("GUNICORN_WORKER_CLASS") or "gthread"
+if worker_class == "gthread":
+    workers = _env_int("GUNICORN_WORKERS", CPU_COUNT + 1)
+    threads = _env_int("GUNICORN_THREADS", 4)
+else:
+    workers = _env_int("GUNICORN_WORKERS", CPU_COUNT * 2 + 1)
+    threads = 1
+
+preload_app = True
+
+# Периодический перезапуск воркеров ограничивает рост памяти, а разброс не дает
+# всем воркерам перезапуститься одновременно.
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 1000)
+max_requests_jitter = _env_int("GUNICORN_MAX_REQUESTS_JITTER", max_requests // 10)
+
+timeout = _env_int("GUNICORN_TIMEOUT", 30)
+graceful_timeout = _env_int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+keepalive = _env_int("GUNICORN_KEEPALIVE", 5)
+
+# Heartbeat-файлы воркеров в памяти, а не на overlay-файловой системе контейнера.
+if os.path.isdir("/dev/shm"):
+    worker_tmp_dir = "/dev/shm"
+
+
+def when_ready(server):
+    """Хук мастер-процесса: приложение уже загружено, воркеры еще не созданы.
+
+    Валидаторы pydantic строятся здесь, чтобы воркеры получили их готовыми.
+    Объекты, созданные при загрузке приложения, переносятся в постоянное поколение
+    сборщика мусора, чтобы его проходы в воркерах не копировали разделяемые страницы.
+    """
+    from server.schema import (
+        CreateAdvertisement,
+        CreateUser,
+        UpdateAdvertisement,
+        UpdateUser,
+        validate,
+    )
+
+    validate(CreateUser, b'{"username": "warm-up", "password": "WarmUp123"}')
+    validate(UpdateUser, b'{"password": "WarmUp123"}')
+    validate(CreateAdvertisement, b'{"title": "warm-up", "text": "warm-up"}')
+    validate(UpdateAdvertisement, b'{"text": "warm-up"}')
+
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """Хук воркера: сброс унаследованного пула соединений и его прогрев.
+
+    Соединения, открытые в мастер-процессе, не должны использоваться в нескольких
+    процессах одновременно, поэтому пул пересоздается без их закрытия.
+    Затем открываются соединения для каждого потока воркера, чтобы первый
+    пользовательский запрос не тратил время на подключение к базе данных.
+    """
+    database = worker.app.wsgi().extensions["database"]
+    database.dispose(close=False)
+
+    connections = []
+    try:
+        for _ in range(min(threads, database.engine.pool.size())):
+            connection = database.engine.connect()
+            connection.exec_driver_sql("SELECT 1")
+            connections.append(connection)
+    except Exception as error:
+        server.log.warning("Worker %s: connection pool warm-up failed: %s", worker.pid, error)
+    finally:
+        for connection in connections:
+            connection.close()
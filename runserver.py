@@ -1,4 +1,6 @@
-from server.routes import app
+from server import create_app
+
+app = create_app()
 
 if __name__ == "__main__":
     app.run()
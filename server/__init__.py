@@ -0,0 +1,32 @@
+def create_app(config: object | dict | str | None = None):
+    """Фабрика приложения.
+
+    :config: модуль, объект, словарь или путь импорта с параметрами в верхнем регистре,
+    которые дополняют и переопределяют значения из server.config.
+
+    Flask, SQLAlchemy и pydantic импортируются только при вызове фабрики, поэтому
+    импорт пакета server (например, из alembic или CLI-утилит) остается дешевым.
+    Движок базы данных и AppBcrypt создаются при первом обращении к ним.
+    """
+    from flask import Flask
+
+    from server.commands import register_commands
+    from server.models import Database, db
+    from server.routes import register_routes
+
+    app = Flask(__name__)
+    app.config.from_object("server.config")
+    if isinstance(config, dict):
+        app.config.from_mapping(config)
+    elif config is not None:
+        app.config.from_object(config)
+
+    dsn, engine_options = app.config["DSN"], app.config["ENGINE_OPTIONS"]
+    if dsn == db.dsn and engine_options == db.engine_options:
+        app.extensions["database"] = db
+    else:
+        app.extensions["database"] = Database(dsn, **engine_options)
+
+    register_routes(app)
+    register_commands(app)
+    return app
@@ -0,0 +1,209 @@
+"""Массовая выгрузка и загрузка пользователей и объявлений.
+
+Выгрузка читает таблицу курсором на стороне сервера порциями фиксированного
+размера, поэтому расход памяти не зависит от объема данных. Загрузка передает
+файл в PostgreSQL командой COPY во временную таблицу и переносит записи
+в основные таблицы одним запросом с учетом ограничений уникальности.
+"""
+
+import csv
+import io
+import json
+from collections.abc import Iterator
+from datetime import datetime
+from typing import IO
+
+import sqlalchemy as sq
+
+from server import stats
+from server.models import Advertisement, Database, User
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+EXPORT_COLUMNS = {
+    "user": (User, ("id", "username", "registered_at")),
+    "advertisement": (
+        Advertisement,
+        ("id", "id_user", "title", "text", "created_at", "updated_at"),
+    ),
+}
+
+IMPORT_COLUMNS = {
+    "user": {
+        "required": ("username", "password"),
+        "optional": ("registered_at",),
+    },
+    "advertisement": {
+        "required": ("username", "title", "text"),
+        "optional": ("created_at", "updated_at"),
+    },
+}
+
+COPY_BUFFER_SIZE = 64 * 1024
+# Хэш bcrypt: версия, стоимость, соль и хэш (53 символа).
+BCRYPT_HASH_PATTERN = r"^\$2[aby]\$\d\d\$.{53}$"
+
+_STAGING_TYPES = {
+    "username": "text",
+    "password": "text",
+    "registered_at": "timestamp",
+    "title": "text",
+    "text": "text",
+    "created_at": "timestamp",
+    "updated_at": "timestamp",
+}
+
+
+def _serialize(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def export_rows(
+    database: Database,
+    name: str,
+    export_format: str = "ndjson",
+    include_passwords: bool = False,
+    batch_size: int = 1000,
+) -> Iterator[str]:
+    """Генератор выгрузки таблицы в формате NDJSON или CSV.
+
+    Строки читаются курсором на стороне сервера по batch_size записей,
+    каждая порция возвращается одним фрагментом текста.
+    :include_passwords: выгружать хэши паролей пользователей (только для CLI).
+    """
+    model, columns = EXPORT_COLUMNS[name]
+    if name == "user" and include_passwords:
+        columns = (*columns, "password")
+    query = (
+        sq.select(*(getattr(model, column) for column in columns))
+        .order_by(model.id)
+        .execution_options(yield_per=batch_size)
+    )
+    with database() as session:
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+        for rows in session.execute(query).partitions():
+            if export_format == "csv":
+                writer.writerows([_serialize(value) for value in row] for row in rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            else:
+                yield "".join(
+                    json.dumps(dict(zip(columns, map(_serialize, row)))) + "\n" for row in rows
+                )
+
+
+def _read_header(name: str, file: IO[str]) -> list[str]:
+    header = next(csv.reader([file.readline()]), [])
+    allowed = IMPORT_COLUMNS[name]
+    missing = set(allowed["required"]) - set(header)
+    unknown = set(header) - set(allowed["required"]) - set(allowed["optional"])
+    if missing or unknown or len(set(header)) != len(header):
+        raise ValueError(
+            f"Invalid CSV header {header}: required columns {allowed['required']}, "
+            f"optional columns {allowed['optional']}"
+        )
+    return header
+
+
+def _copy_to_staging(session: sq.orm.Session, name: str, file: IO[str]) -> None:
+    """Загрузка CSV-файла с заголовком во временную таблицу staging_<name> командой COPY."""
+    header = _read_header(name, file)
+    columns = IMPORT_COLUMNS[name]["required"] + IMPORT_COLUMNS[name]["optional"]
+    # Номер строки файла: из повторяющихся записей загружается первая.
+    definition = ", ".join(
+        ["line bigserial"] + [f"{column} {_STAGING_TYPES[column]}" for column in columns]
+    )
+    session.execute(sq.text(f"CREATE TEMP TABLE staging_{name} ({definition}) ON COMMIT DROP"))
+    statement = f"COPY staging_{name} ({', '.join(header)}) FROM STDIN WITH (FORMAT csv)"
+    cursor = session.connection().connection.driver_connection.cursor()
+    try:
+        if session.get_bind().dialect.driver == "psycopg":
+            with cursor.copy(statement) as copy:
+                while data := file.read(COPY_BUFFER_SIZE):
+                    copy.write(data)
+        else:
+            cursor.copy_expert(statement, file)
+    finally:
+        cursor.close()
+
+
+def import_users(session: sq.orm.Session, file: IO[str]) -> tuple[int, int]:
+    """Загрузка пользователей из CSV-файла.
+
+    Колонки: username, password (хэш bcrypt), registered_at (необязательная).
+    Пользователи с уже существующими, повторяющимися в файле или слишком длинными
+    именами, а также с паролями, не являющимися хэшами bcrypt, пропускаются.
+    Возвращает количество загруженных и пропущенных записей.
+    """
+    _copy_to_staging(session, "user", file)
+    total = session.scalar(sq.text("SELECT count(*) FROM staging_user"))
+    result = session.execute(
+        sq.text(
+            'INSERT INTO "User" (username, password, registered_at) '
+            "SELECT DISTINCT ON (username) username, password, coalesce(registered_at, now()) "
+            "FROM staging_user "
+            "WHERE char_length(username) <= :max_length AND password ~ :password_pattern "
+            "ORDER BY username, line "
+            "ON CONFLICT (username) DO NOTHING"
+        ),
+        {"max_length": User.username.type.length, "password_pattern": BCRYPT_HASH_PATTERN},
+    )
+    return result.rowcount, total - result.rowcount
+
+
+def import_advertisements(session: sq.orm.Session, file: IO[str]) -> tuple[int, int]:
+    """Загрузка объявлений из CSV-файла.
+
+    Колонки: username (владелец), title, text, created_at и updated_at (необязательные).
+    Объявления неизвестных пользователей, с уже существующими, повторяющимися
+    в файле или слишком длинными заголовками пропускаются. Статистика владельцев пересчитывается.
+    Возвращает количество загруженных и пропущенных записей.
+    """
+    _copy_to_staging(session, "advertisement", file)
+    total = session.scalar(sq.text("SELECT count(*) FROM staging_advertisement"))
+    # Секции для месяцев загружаемых объявлений, в том числе прошедших.
+    session.execute(
+        sq.text(
+            "SELECT advertisement_create_partition(month) FROM (SELECT DISTINCT "
+            "date_trunc('month', coalesce(created_at, now()::timestamp)) AS month "
+            "FROM staging_advertisement) months"
+        )
+    )
+    session.execute(
+        sq.text(
+            "CREATE TEMP TABLE import_advertisement ON COMMIT DROP AS "
+            "SELECT nextval('\"Advertisement_id_seq\"')::integer AS id, s.* FROM ("
+            "SELECT DISTINCT ON (s.title) u.id AS id_user, s.title, s.text, "
+            "coalesce(s.created_at, now()::timestamp) AS created_at, "
+            "coalesce(s.updated_at, s.created_at, now()::timestamp) AS updated_at "
+            'FROM staging_advertisement s JOIN "User" u ON u.username = s.username '
+            "WHERE char_length(s.title) <= :max_length AND s.text IS NOT NULL "
+            "ORDER BY s.title, s.line) s"
+        ),
+        {"max_length": Advertisement.title.type.length},
+    )
+    # Заголовки резервируются заранее: при одновременном создании объявления
+    # с тем же заголовком одна из вставок дожидается другой и не проходит.
+    session.execute(
+        sq.text(
+            'INSERT INTO "AdvertisementTitle" (title, id_advertisement, created_at) '
+            "SELECT title, id, created_at FROM import_advertisement "
+            "ON CONFLICT (title) DO NOTHING"
+        )
+    )
+    user_ids = session.scalars(
+        sq.text(
+            'INSERT INTO "Advertisement" (id, id_user, title, text, created_at, updated_at) '
+            "SELECT a.id, a.id_user, a.title, a.text, a.created_at, a.updated_at "
+            'FROM import_advertisement a JOIN "AdvertisementTitle" t '
+            "ON t.title = a.title AND t.id_advertisement = a.id "
+            "RETURNING id_user"
+        )
+    ).all()
+    if user_ids:
+        stats.rebuild(session, set(user_ids))
+    return len(user_ids), total - len(user_ids)
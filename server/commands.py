@@ -0,0 +1,121 @@
+from datetime import datetime
+
+import click
+from flask import Flask, current_app
+from flask.cli import AppGroup
+
+from server import bulk, deletion, idempotency, partitions, stats, sync
+
+stats_cli = AppGroup("stats", help="Статистика объявлений пользователей.")
+data_cli = AppGroup("data", help="Массовая выгрузка и загрузка данных.")
+idempotency_cli = AppGroup("idempotency", help="Сохраненные ответы на POST-запросы.")
+partitions_cli = AppGroup("partitions", help="Секции таблицы объявлений по месяцам.")
+users_cli = AppGroup("users", help="Пользователи.")
+sync_cli = AppGroup("sync", help="Синхронизация клиентов.")
+
+
+@stats_cli.command("rebuild")
+@click.option("--user", "user_ids", type=int, multiple=True, help="Идентификатор пользователя.")
+def rebuild_stats(user_ids: tuple[int, ...]) -> None:
+    """Полный пересчет статистики всех или указанных пользователей."""
+    with current_app.extensions["database"]() as session:
+        count = stats.rebuild(session, user_ids or None)
+        session.commit()
+    click.echo(f"Statistics rebuilt for {count} users")
+
+
+@data_cli.command("export")
+@click.argument("name", type=click.Choice(list(bulk.EXPORT_COLUMNS)))
+@click.option(
+    "--format", "export_format", type=click.Choice(list(bulk.EXPORT_FORMATS)), default="ndjson"
+)
+@click.option("--output", type=click.File("w", encoding="utf-8"), default="-")
+@click.option("--include-passwords", is_flag=True, help="Выгрузить хэши паролей пользователей.")
+def export_data(name: str, export_format: str, output, include_passwords: bool) -> None:
+    """Выгрузка всех пользователей или объявлений в формате NDJSON или CSV."""
+    database = current_app.extensions["database"]
+    for chunk in bulk.export_rows(database, name, export_format, include_passwords):
+        output.write(chunk)
+
+
+@data_cli.command("import")
+@click.argument("name", type=click.Choice(list(bulk.IMPORT_COLUMNS)))
+@click.argument("file", type=click.File("r", encoding="utf-8"))
+def import_data(name: str, file) -> None:
+    """Загрузка пользователей или объявлений из CSV-файла с заголовком через COPY."""
+    importer = bulk.import_users if name == "user" else bulk.import_advertisements
+    with current_app.extensions["database"]() as session:
+        try:
+            loaded, skipped = importer(session, file)
+        except ValueError as error:
+            raise click.UsageError(str(error))
+        session.commit()
+    click.echo(f"Loaded {loaded}, skipped {skipped}")
+
+
+@idempotency_cli.command("cleanup")
+def cleanup_idempotency_keys() -> None:
+    """Удаление ключей идемпотентности старше IDEMPOTENCY_KEY_TTL секунд."""
+    with current_app.extensions["database"].engine.begin() as connection:
+        count = idempotency.delete_expired(connection, current_app.config["IDEMPOTENCY_KEY_TTL"])
+    click.echo(f"Deleted {count} expired keys")
+
+
+@partitions_cli.command("create")
+@click.option("--months-ahead", type=click.IntRange(min=0), help="Количество месяцев вперед.")
+def create_partitions(months_ahead: int | None) -> None:
+    """Создание секций объявлений на ближайшие месяцы."""
+    if months_ahead is None:
+        months_ahead = current_app.config["ADVERTISEMENT_PARTITIONS_AHEAD"]
+    with current_app.extensions["database"]() as session:
+        count = partitions.ensure_partitions(session, months_ahead)
+        session.commit()
+    click.echo(f"Created {count} partitions")
+
+
+@partitions_cli.command("archive")
+@click.option(
+    "--before", type=click.DateTime(["%Y-%m-%d"]), required=True, help="Дата ГГГГ-ММ-ДД."
+)
+def archive_partitions(before: datetime) -> None:
+    """Перенос в схему archive секций с объявлениями, созданными раньше даты.
+
+    Каждая секция отсоединяется без блокировки таблицы и переносится в отдельной транзакции.
+    """
+    count = 0
+    for name in partitions.archive_partitions(current_app.extensions["database"], before):
+        click.echo(f"Archived {name}")
+        count += 1
+    click.echo(f"Archived {count} partitions")
+
+
+@users_cli.command("delete-pending")
+def delete_pending_users() -> None:
+    """Завершение фонового удаления пользователей, прерванного перезапуском воркера."""
+    database = current_app.extensions["database"]
+    chunk_size = current_app.config["USER_DELETE_CHUNK_SIZE"]
+    with database() as session:
+        user_ids = deletion.pending_user_ids(session)
+    count = 0
+    for user_id in user_ids:
+        if deletion.delete_user(database, user_id, chunk_size):
+            count += 1
+    click.echo(f"Deleted {count} users")
+
+
+@sync_cli.command("cleanup")
+def cleanup_tombstones() -> None:
+    """Удаление записей об удалениях старше SYNC_TOMBSTONE_TTL секунд."""
+    with current_app.extensions["database"].engine.begin() as connection:
+        count = sync.delete_expired(connection, current_app.config["SYNC_TOMBSTONE_TTL"])
+    click.echo(f"Deleted {count} expired tombstones")
+
+
+def register_commands(app: Flask) -> None:
+    """Функция регистрации CLI-команд приложения."""
+    app.cli.add_command(stats_cli)
+    app.cli.add_command(data_cli)
+    app.cli.add_command(idempotency_cli)
+    app.cli.add_command(partitions_cli)
+    app.cli.add_command(users_cli)
+    app.cli.add_command(sync_cli)
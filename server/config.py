@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 SECRET_KEY = "99e61824538628af8b7d8d774b05d6b4"
 POSTGRES_USER = os.getenv("POSTGRES_USER", "postgres")
@@ -6,3 +7,46 @@ POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", os.getenv("PSQLPASS"))
 POSTGRES_HOST = os.getenv("POSTGRES_HOST", "localhost")
 POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5432")
 POSTGRES_DB = os.getenv("POSTGRES_DB", "flaskproject")
+
+# Драйвер PostgreSQL: psycopg2 или psycopg (psycopg 3).
+POSTGRES_DRIVER = os.getenv("POSTGRES_DRIVER", "psycopg2")
+
+DSN = (
+    f"postgresql+{POSTGRES_DRIVER}://{POSTGRES_USER}:{POSTGRES_PASSWORD}@"
+    f"{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+)
+ENGINE_OPTIONS: dict = {}
+if POSTGRES_DRIVER == "psycopg":
+    # Запрос, выполненный на соединении POSTGRES_PREPARE_THRESHOLD раз, подготавливается
+    # на сервере (0 - сразу, none - никогда). POSTGRES_BINARY_RESULTS=1 - результаты
+    # запросов передаются в двоичном формате.
+    _prepare_threshold = os.getenv("POSTGRES_PREPARE_THRESHOLD", "5")
+    ENGINE_OPTIONS = {
+        "connect_args": {
+            "prepare_threshold": None if _prepare_threshold == "none" else int(_prepare_threshold)
+        },
+        "binary_results": os.getenv("POSTGRES_BINARY_RESULTS", "0") == "1",
+    }
+
+MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", str(64 * 1024)))
+
+LIST_TOTAL_MODE = os.getenv("LIST_TOTAL_MODE", "off")
+LIST_TOTAL_CACHE_TTL = int(os.getenv("LIST_TOTAL_CACHE_TTL", "30"))
+ADVERTISEMENT_STREAM_BUFFER_SIZE = int(os.getenv("ADVERTISEMENT_STREAM_BUFFER_SIZE", "1000"))
+ADVERTISEMENT_STREAM_KEEPALIVE = int(os.getenv("ADVERTISEMENT_STREAM_KEEPALIVE", "15"))
+ADVERTISEMENT_STREAM_MAX_DURATION = int(os.getenv("ADVERTISEMENT_STREAM_MAX_DURATION", "300"))
+# Подписчики потока в одном воркере: каждый занимает поток воркера.
+ADVERTISEMENT_STREAM_MAX_SUBSCRIBERS = int(os.getenv("ADVERTISEMENT_STREAM_MAX_SUBSCRIBERS", "2"))
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", str(24 * 60 * 60)))
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", "10"))
+ADVERTISEMENT_PARTITIONS_AHEAD = int(os.getenv("ADVERTISEMENT_PARTITIONS_AHEAD", "3"))
+# Пользователь с большим числом объявлений удаляется в фоне частями по USER_DELETE_CHUNK_SIZE.
+USER_DELETE_ASYNC_THRESHOLD = int(os.getenv("USER_DELETE_ASYNC_THRESHOLD", "1000"))
+USER_DELETE_CHUNK_SIZE = int(os.getenv("USER_DELETE_CHUNK_SIZE", "1000"))
+# Время хранения записей об удалениях для синхронизации клиентов (GET /sync).
+SYNC_TOMBSTONE_TTL = int(os.getenv("SYNC_TOMBSTONE_TTL", str(30 * 24 * 60 * 60)))
+# Профилирование воркеров (см. server.profiling): без токена выключено.
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN") or None
+PROFILING_MAX_SECONDS = int(os.getenv("PROFILING_MAX_SECONDS", "30"))
+PROFILING_DIR = os.getenv("PROFILING_DIR") or os.path.join(tempfile.gettempdir(), "profiles")
+PROFILING_MAX_PROFILES = int(os.getenv("PROFILING_MAX_PROFILES", "100"))
@@ -0,0 +1,121 @@
+"""Фоновое удаление пользователей с большим числом объявлений.
+
+Удаление пользователя с объявлениями одним запросом выполняется одной долгой
+транзакцией, которая удерживает блокировки и занимает поток воркера. Поэтому
+у такого пользователя сначала отмечается 'deletion_requested_at': он перестает
+проходить аутентификацию и возвращаться API, - а объявления удаляются в отдельном
+потоке частями, каждая в своей транзакции. Последним удаляется сам пользователь.
+
+Поток не переживает перезапуск воркера: незавершенные удаления продолжает
+команда 'flask users delete-pending'. Одновременно одного пользователя удаляет
+только один процесс (advisory-блокировка на время удаления).
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import sqlalchemy as sq
+
+from server import sync
+from server.models import Database, User
+
+# Первый ключ advisory-блокировок удаления, второй - идентификатор пользователя.
+LOCK_NAMESPACE = sq.func.hashtext("user deletion")
+
+logger = logging.getLogger(__name__)
+
+_executor: ThreadPoolExecutor | None = None
+_executor_pid: int | None = None
+_executor_lock = threading.Lock()
+
+
+def request_deletion(session: sq.orm.Session, user: User) -> None:
+    """Отметка пользователя к фоновому удалению в транзакции сессии.
+
+    Для синхронизации клиентов пользователь считается удаленным с этого момента.
+    """
+    user.deletion_requested_at = sq.func.now()
+    session.add(user)
+    sync.add_tombstone(session, user)
+
+
+def pending_user_ids(session: sq.orm.Session) -> list[int]:
+    """Идентификаторы пользователей, удаление которых не завершено."""
+    query = (
+        sq.select(User.id)
+        .where(User.deletion_requested_at.is_not(None))
+        .order_by(User.deletion_requested_at)
+    )
+    return list(session.scalars(query))
+
+
+def _delete_chunk(connection: sq.Connection, user_id: int, chunk_size: int) -> int:
+    deleted = connection.execute(
+        sq.text(
+            'DELETE FROM "Advertisement" WHERE (id, created_at) IN ('
+            'SELECT id, created_at FROM "Advertisement" WHERE id_user = :id_user '
+            "ORDER BY created_at LIMIT :chunk_size)"
+        ),
+        {"id_user": user_id, "chunk_size": chunk_size},
+    ).rowcount
+    if deleted:
+        connection.execute(
+            sq.text(
+                'UPDATE "UserStats" SET advertisements_count = advertisements_count - :deleted '
+                "WHERE id_user = :id_user"
+            ),
+            {"id_user": user_id, "deleted": deleted},
+        )
+    return deleted
+
+
+def delete_user(database: Database, user_id: int, chunk_size: int) -> bool:
+    """Удаление отмеченного пользователя и его объявлений частями по chunk_size.
+
+    Возвращает False, если пользователя уже удаляет другой процесс
+    или он не отмечен к удалению.
+    """
+    lock = sq.select(sq.func.pg_try_advisory_lock(LOCK_NAMESPACE, user_id))
+    with database.engine.connect() as connection:
+        locked = connection.scalar(lock)
+        connection.commit()
+        if not locked:
+            return False
+        try:
+            requested = connection.scalar(
+                sq.select(User.deletion_requested_at).where(User.id == user_id)
+            )
+            connection.commit()
+            if requested is None:
+                return False
+            while _delete_chunk(connection, user_id, chunk_size):
+                connection.commit()
+            connection.execute(sq.delete(User).where(User.id == user_id))
+            connection.commit()
+            return True
+        finally:
+            connection.rollback()
+            connection.execute(sq.select(sq.func.pg_advisory_unlock(LOCK_NAMESPACE, user_id)))
+            connection.commit()
+
+
+def _log_failure(future: Future) -> None:
+    if future.exception() is not None:
+        logger.error("User deletion failed", exc_info=future.exception())
+
+
+def schedule(database: Database, user_id: int, chunk_size: int) -> Future:
+    """Запуск удаления пользователя в фоновом потоке процесса.
+
+    Поток пула не переживает fork, поэтому пул создается заново в каждом процессе.
+    """
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="user-deletion")
+            _executor_pid = os.getpid()
+        future = _executor.submit(delete_user, database, user_id, chunk_size)
+    future.add_done_callback(_log_failure)
+    return future
@@ -0,0 +1,250 @@
+"""Лента изменений объявлений на основе LISTEN/NOTIFY PostgreSQL.
+
+Изменения публикуются командой NOTIFY в транзакции изменения объявления и
+доставляются только после ее фиксации. В каждом процессе одно выделенное
+соединение выполняет LISTEN и рассылает события всем подписчикам процесса,
+сохраняя последние из них для возобновления потока по Last-Event-ID.
+"""
+
+import collections
+import json
+import logging
+import os
+import queue
+import select
+import threading
+import time
+import uuid
+from collections.abc import Iterator
+
+import sqlalchemy as sq
+
+from server.models import Advertisement, Database
+
+CHANNEL = "advertisement"
+# Предельный размер полезной нагрузки NOTIFY - 8000 байт.
+MAX_PAYLOAD_SIZE = 7900
+
+logger = logging.getLogger(__name__)
+
+
+def prepare(session: sq.orm.Session, event: str, advertisement: Advertisement) -> str:
+    """Функция подготовки сообщения о событии объявления для publish.
+
+    :event: created, updated или deleted.
+
+    Данные объявления читаются до публикации, поэтому publish может выполняться
+    в режиме pipeline (см. server.models.pipeline). Если данные не помещаются
+    в NOTIFY, сообщение содержит только идентификатор, а данные загружает слушатель.
+    """
+    if event == "deleted":
+        data = {"id": advertisement.id}
+    else:
+        session.flush()
+        data = advertisement.as_dict
+    message = {"id": uuid.uuid4().hex, "event": event, "data": data}
+    payload = json.dumps(message)
+    if len(payload.encode()) > MAX_PAYLOAD_SIZE:
+        message["data"] = {"id": advertisement.id}
+        message["partial"] = True
+        payload = json.dumps(message)
+    return payload
+
+
+def publish(session: sq.orm.Session, payload: str) -> None:
+    """Функция публикации подготовленного сообщения в текущей транзакции."""
+    session.execute(sq.select(sq.func.pg_notify(CHANNEL, payload)))
+
+
+class Subscription:
+    """Подписка на ленту: очередь событий и события для повторной отправки.
+
+    :replay: события, пропущенные клиентом, или None, если событие
+    Last-Event-ID уже вытеснено из буфера и клиенту нужно перечитать список.
+    """
+
+    def __init__(self, maxsize: int, replay: list[dict] | None) -> None:
+        self.queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self.replay = replay
+        self.overflowed = False
+
+
+class AdvertisementFeed:
+    """Слушатель канала NOTIFY и рассылка событий подписчикам процесса.
+
+    Поток слушателя запускается при первой подписке и переподключается
+    к базе данных при обрыве соединения.
+    """
+
+    def __init__(
+        self,
+        database: Database,
+        buffer_size: int = 1000,
+        queue_size: int = 100,
+        poll_timeout: float = 5,
+    ) -> None:
+        self.database = database
+        self.queue_size = queue_size
+        self.poll_timeout = poll_timeout
+        self.pid = os.getpid()
+        self._buffer: collections.deque[dict] = collections.deque(maxlen=buffer_size)
+        self._subscriptions: set[Subscription] = set()
+        self._lock = threading.Lock()
+        self._listening = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def subscribe(
+        self, last_event_id: str | None = None, max_subscribers: int | None = None
+    ) -> Subscription | None:
+        """Метод подписки на ленту.
+
+        Возвращает None, если у ленты процесса уже max_subscribers подписчиков.
+        """
+        self._start()
+        with self._lock:
+            if max_subscribers is not None and len(self._subscriptions) >= max_subscribers:
+                return None
+            replay: list[dict] | None = []
+            if last_event_id:
+                ids = [event["id"] for event in self._buffer]
+                if last_event_id in ids:
+                    replay = list(self._buffer)[ids.index(last_event_id) + 1:]
+                else:
+                    replay = None
+            subscription = Subscription(self.queue_size, replay)
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def wait_until_listening(self, timeout: float | None = None) -> bool:
+        return self._listening.wait(timeout)
+
+    def dispatch(self, event: dict) -> None:
+        """Метод сохранения события в буфер и рассылки подписчикам.
+
+        Подписчик, не успевающий забирать события, отключается от ленты.
+        """
+        with self._lock:
+            self._buffer.append(event)
+            for subscription in list(self._subscriptions):
+                try:
+                    subscription.queue.put_nowait(event)
+                except queue.Full:
+                    subscription.overflowed = True
+                    self._subscriptions.discard(subscription)
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="advertisement-feed", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("Advertisement feed listener failed, reconnecting")
+            finally:
+                self._listening.clear()
+            time.sleep(self.poll_timeout)
+
+    def _listen(self) -> None:
+        connection = self.database.engine.raw_connection()
+        driver_connection = connection.driver_connection
+        connection.detach()
+        try:
+            driver_connection.autocommit = True
+            with driver_connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            self._listening.set()
+            if self.database.engine.dialect.driver == "psycopg":
+                self._receive_psycopg(driver_connection)
+            else:
+                self._receive_psycopg2(driver_connection)
+        finally:
+            connection.close()
+
+    def _receive_psycopg2(self, driver_connection) -> None:
+        while True:
+            if select.select([driver_connection], [], [], self.poll_timeout) == ([], [], []):
+                continue
+            driver_connection.poll()
+            while driver_connection.notifies:
+                notify = driver_connection.notifies.pop(0)
+                self.dispatch(self._load(json.loads(notify.payload)))
+
+    def _receive_psycopg(self, driver_connection) -> None:
+        while True:
+            for notify in driver_connection.notifies(timeout=self.poll_timeout):
+                self.dispatch(self._load(json.loads(notify.payload)))
+
+    def _load(self, event: dict) -> dict:
+        """Метод дозагрузки данных объявления, не поместившихся в NOTIFY."""
+        if event.pop("partial", False):
+            with self.database() as session:
+                advertisement = session.scalar(Advertisement.select_by_id(event["data"]["id"]))
+                if advertisement is None:
+                    event["event"] = "deleted"
+                else:
+                    event["data"] = advertisement.as_dict
+        return event
+
+
+_feeds: dict[int, AdvertisementFeed] = {}
+_feeds_lock = threading.Lock()
+
+
+def get_feed(database: Database, **options) -> AdvertisementFeed:
+    """Функция получения ленты процесса для базы данных.
+
+    Поток слушателя не переживает fork, поэтому лента создается заново в каждом процессе.
+    """
+    with _feeds_lock:
+        feed = _feeds.get(id(database))
+        if feed is None or feed.pid != os.getpid():
+            feed = _feeds[id(database)] = AdvertisementFeed(database, **options)
+        return feed
+
+
+def format_event(event: dict) -> str:
+    """Функция форматирования события в формат Server-Sent Events."""
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+def stream_events(
+    feed: AdvertisementFeed, subscription: Subscription, keepalive: float, max_duration: float
+) -> Iterator[str]:
+    """Генератор потока Server-Sent Events для подписки.
+
+    Если пропущенные события недоступны или подписчик не успевал их забирать,
+    отправляется событие reset: клиенту нужно перечитать список объявлений.
+    Поток закрывается через max_duration секунд, клиент переподключается
+    с заголовком Last-Event-ID.
+    """
+    reset = "event: reset\ndata: {}\n\n"
+    try:
+        yield "retry: 3000\n\n"
+        if subscription.replay is None:
+            yield reset
+        else:
+            for event in subscription.replay:
+                yield format_event(event)
+        deadline = time.monotonic() + max_duration
+        while time.monotonic() < deadline:
+            try:
+                event = subscription.queue.get(timeout=keepalive)
+            except queue.Empty:
+                if subscription.overflowed:
+                    yield reset
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            yield format_event(event)
+    finally:
+        feed.unsubscribe(subscription)
@@ -0,0 +1,136 @@
+"""Идемпотентность POST-запросов по заголовку Idempotency-Key.
+
+Первый ответ на запрос с ключом сохраняется в таблице 'IdempotencyKey'
+в транзакции самого запроса: ответ сохраняется тогда и только тогда, когда
+фиксируются изменения. Повторные запросы с тем же ключом получают сохраненный
+ответ без повторного выполнения обработчика. Одновременные запросы с одним
+ключом выстраиваются в очередь рекомендательной блокировкой PostgreSQL
+в той же транзакции: обработчик выполняет только первый из них, остальные
+дожидаются его фиксации и получают сохраненный ответ.
+"""
+
+import functools
+import hashlib
+import random
+import uuid
+
+import sqlalchemy as sq
+from flask import Response, current_app, request
+from sqlalchemy.dialects.postgresql import insert
+
+from server.exceptions import HttpError
+from server.models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = IdempotencyKey.key.type.length
+# Доля запросов, попутно удаляющих просроченные ключи.
+CLEANUP_PROBABILITY = 0.01
+LOCK_NOT_AVAILABLE = "55P03"
+
+
+def _expiration_time(ttl: int) -> sq.ColumnElement:
+    return sq.func.now() - sq.func.make_interval(0, 0, 0, 0, 0, 0, ttl)
+
+
+def _sqlstate(error: sq.exc.DBAPIError) -> str | None:
+    return getattr(error.orig, "pgcode", None) or getattr(error.orig, "sqlstate", None)
+
+
+def delete_expired(connection: sq.Connection, ttl: int) -> int:
+    """Функция удаления просроченных ключей. Возвращает количество удаленных записей."""
+    query = sq.delete(IdempotencyKey).where(IdempotencyKey.created_at < _expiration_time(ttl))
+    return connection.execute(query).rowcount
+
+
+def _replay(stored: IdempotencyKey) -> Response:
+    response = Response(stored.body, status=stored.status_code, content_type=stored.content_type)
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def save_response(session: sq.orm.Session, response: Response) -> None:
+    """Функция сохранения ответа на запрос с ключом в текущей транзакции.
+
+    Вызывается обработчиком перед фиксацией изменений (см. BaseView.commit_changes);
+    для запроса без ключа ничего не делает.
+    """
+    pending: dict | None = getattr(request, "idempotency", None)
+    if pending is None:
+        return
+    values = {
+        "fingerprint": pending["fingerprint"],
+        "status_code": response.status_code,
+        "content_type": response.content_type,
+        "body": response.get_data(),
+        "created_at": sq.func.now(),
+    }
+    query = insert(IdempotencyKey).values(key=pending["key"], scope=pending["scope"], **values)
+    session.execute(
+        query.on_conflict_do_update(
+            index_elements=[IdempotencyKey.key, IdempotencyKey.scope], set_=values
+        )
+    )
+    if random.random() < CLEANUP_PROBABILITY:
+        delete_expired(session.connection(), pending["ttl"])
+    request.idempotency = None
+
+
+def idempotent(old_method):
+    """Функция-декоратор идемпотентного выполнения метода view-класса.
+
+    Ключ действует в пределах метода, пути и аутентифицированного пользователя,
+    поэтому должен применяться после декоратора authentication. Ключи анонимных
+    запросов общие для всех клиентов и должны быть UUID.
+    Метод передает ответ в commit_changes, чтобы он был сохранен в транзакции изменений.
+    Повтор ключа с другим телом запроса возвращает 422 HTTP-ответ,
+    истечение IDEMPOTENCY_LOCK_TIMEOUT в ожидании первого запроса - 409 HTTP-ответ.
+    """
+
+    @functools.wraps(old_method)
+    def new_method(view_class, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return old_method(view_class, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise HttpError(400, f"{HEADER} must be from 1 to {MAX_KEY_LENGTH} characters long")
+
+        scope = f"{request.method} {request.path}"
+        if request.is_authenticated:
+            scope = f"{scope} user={request.user.id}"
+        else:
+            try:
+                uuid.UUID(key)
+            except ValueError:
+                raise HttpError(400, f"{HEADER} of an anonymous request must be a UUID")
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+        ttl: int = current_app.config["IDEMPOTENCY_KEY_TTL"]
+        lock_timeout: int = current_app.config["IDEMPOTENCY_LOCK_TIMEOUT"]
+
+        session: sq.orm.Session = request.session
+        session.execute(sq.select(sq.func.set_config("lock_timeout", f"{lock_timeout}s", True)))
+        try:
+            lock_id = sq.func.hashtextextended(f"{scope} {key}", 0)
+            session.execute(sq.select(sq.func.pg_advisory_xact_lock(lock_id)))
+        except sq.exc.OperationalError as error:
+            session.rollback()
+            if _sqlstate(error) == LOCK_NOT_AVAILABLE:
+                raise HttpError(409, f"A request with this {HEADER} is still being processed")
+            raise
+        session.execute(sq.text("SET LOCAL lock_timeout TO DEFAULT"))
+
+        stored = session.execute(
+            sq.select(IdempotencyKey).where(
+                IdempotencyKey.key == key,
+                IdempotencyKey.scope == scope,
+                IdempotencyKey.created_at >= _expiration_time(ttl),
+            )
+        ).scalar()
+        if stored is not None:
+            if stored.fingerprint != fingerprint:
+                raise HttpError(422, f"{HEADER} was already used with a different request")
+            return _replay(stored)
+
+        request.idempotency = {"key": key, "scope": scope, "fingerprint": fingerprint, "ttl": ttl}
+        return old_method(view_class, *args, **kwargs)
+
+    return new_method
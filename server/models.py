@@ -1,3 +1,7 @@
+import contextlib
+import functools
+import threading
+from collections.abc import Iterator
 from datetime import datetime
 
 import sqlalchemy as sq
@@ -12,14 +16,85 @@ from sqlalchemy.orm import (
 
 import server.config as cfg
 
-DSN = (
-    f"postgresql://{cfg.POSTGRES_USER}:{cfg.POSTGRES_PASSWORD}@"
-    f"{cfg.POSTGRES_HOST}:{cfg.POSTGRES_PORT}/{cfg.POSTGRES_DB}"
-)
-engine = sq.create_engine(DSN)
-session_factory = sessionmaker(bind=engine)
-Session = scoped_session(session_factory=session_factory)
-# Session = sessionmaker(bind=engine)
+
+@functools.cache
+def _binary_cursor_class() -> type:
+    import psycopg
+
+    class BinaryCursor(psycopg.Cursor):
+        """Курсор psycopg 3, получающий результаты запросов в двоичном формате."""
+
+        def __init__(self, *args, **kwargs) -> None:
+            super().__init__(*args, **kwargs)
+            self.format = psycopg.pq.Format.BINARY
+
+    return BinaryCursor
+
+
+def _use_binary_results(dbapi_connection, connection_record) -> None:
+    dbapi_connection.cursor_factory = _binary_cursor_class()
+
+
+class Database:
+    """Подключение к базе данных с отложенным созданием движка.
+
+    Движок и пул соединений создаются при первом обращении к свойству engine,
+    а не при импорте модуля. Экземпляр вызываемый и возвращает новую сессию,
+    поэтому может использоваться как фабрика для scoped_session.
+    :binary_results: (параметр engine_options, только psycopg 3) получать
+    результаты запросов в двоичном формате.
+    """
+
+    def __init__(self, dsn: str, **engine_options) -> None:
+        self.dsn = dsn
+        self.engine_options = engine_options
+        self._engine: sq.Engine | None = None
+        self._session_factory = sessionmaker()
+        self._lock = threading.Lock()
+
+    def __call__(self) -> sq.orm.Session:
+        return self._session_factory(bind=self.engine)
+
+    @property
+    def engine(self) -> sq.Engine:
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    options = dict(self.engine_options)
+                    binary_results = options.pop("binary_results", False)
+                    engine = sq.create_engine(self.dsn, **options)
+                    if binary_results:
+                        sq.event.listen(engine, "connect", _use_binary_results)
+                    self._engine = engine
+        return self._engine
+
+    def dispose(self, close: bool = True) -> None:
+        """Метод сброса пула соединений.
+
+        :close: закрыть соединения; при False соединения, унаследованные
+        после fork, просто отбрасываются.
+        """
+        if self._engine is not None:
+            self._engine.dispose(close=close)
+
+
+@contextlib.contextmanager
+def pipeline(session: sq.orm.Session) -> Iterator[None]:
+    """Контекстный менеджер режима pipeline psycopg 3.
+
+    Запросы, результаты которых не читаются, отправляются без ожидания ответа
+    и синхронизируются одним обменом с сервером при выходе из блока.
+    Ошибки таких запросов возникают при выходе. Для psycopg2 ничего не делает.
+    """
+    if session.get_bind().dialect.driver != "psycopg":
+        yield
+        return
+    with session.connection().connection.driver_connection.pipeline():
+        yield
+
+
+db = Database(cfg.DSN, **cfg.ENGINE_OPTIONS)
+Session = scoped_session(session_factory=db)
 
 
 class Base(DeclarativeBase):
@@ -27,17 +102,33 @@ class Base(DeclarativeBase):
 
 
 class User(Base):
-    """Модель таблицы 'User'."""
+    """Модель таблицы 'User'.
+
+    Объявления удаляются вместе с пользователем каскадом внешнего ключа на стороне
+    базы данных, без загрузки в сессию. 'deletion_requested_at' - время запроса
+    фонового удаления пользователя с большим числом объявлений (см. server.deletion).
+    """
 
     __tablename__ = "User"
+    __table_args__ = (
+        sq.Index(
+            "ix_User_deletion_requested_at",
+            "deletion_requested_at",
+            postgresql_where=sq.text("deletion_requested_at IS NOT NULL"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(sq.Integer, primary_key=True)
     username: Mapped[str] = mapped_column(sq.String(50), unique=True)
     password: Mapped[str] = mapped_column(sq.String(100))
     registered_at: Mapped[datetime] = mapped_column(sq.DateTime, server_default=sq.func.now())
+    updated_at: Mapped[datetime] = mapped_column(
+        sq.DateTime, server_default=sq.func.now(), onupdate=sq.func.now(), index=True
+    )
+    deletion_requested_at: Mapped[datetime | None] = mapped_column(sq.DateTime)
 
     advertisements: Mapped[list["Advertisement"]] = relationship(
-        "Advertisement", back_populates="user", cascade="all, delete-orphan"
+        "Advertisement", back_populates="user", cascade="all, delete-orphan", passive_deletes=True
     )
 
     def __str__(self):
@@ -53,15 +144,29 @@ class User(Base):
 
 
 class Advertisement(Base):
-    """Модель таблицы 'Advertisement'."""
+    """Модель таблицы 'Advertisement'.
+
+    Таблица секционирована по месяцам 'created_at' (см. server.partitions), поэтому
+    первичный ключ таблицы составной, а в ORM объявления идентифицируются по 'id'.
+    Уникальность заголовков и поиск секции объявления по 'id' обеспечивает таблица
+    'AdvertisementTitle', которую ведет триггер.
+    """
 
     __tablename__ = "Advertisement"
+    __table_args__ = (
+        sq.Index("ix_Advertisement_id_user_created_at", "id_user", "created_at"),
+        sq.Index("ix_Advertisement_updated_at", "updated_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+    __mapper_args__ = {"primary_key": ["id"]}
 
-    id: Mapped[int] = mapped_column(sq.Integer, primary_key=True)
+    id: Mapped[int] = mapped_column(sq.Integer, primary_key=True, autoincrement=True)
     id_user: Mapped[int] = mapped_column(sq.Integer, sq.ForeignKey(User.id, ondelete="CASCADE"))
-    title: Mapped[str] = mapped_column(sq.String(50), nullable=False, unique=True)
+    title: Mapped[str] = mapped_column(sq.String(50), nullable=False)
     text: Mapped[str] = mapped_column(sq.Text, nullable=False)
-    created_at: Mapped[datetime] = mapped_column(sq.DateTime, server_default=sq.func.now())
+    created_at: Mapped[datetime] = mapped_column(
+        sq.DateTime, primary_key=True, server_default=sq.func.now()
+    )
     updated_at: Mapped[datetime] = mapped_column(
         sq.DateTime, server_default=sq.func.now(), onupdate=sq.func.now()
     )
@@ -85,3 +190,109 @@ class Advertisement(Base):
             "created_at": self.created_at.isoformat(),
             "updated_at": self.updated_at.isoformat(),
         }
+
+    @classmethod
+    def select_by_id(cls, id: int) -> sq.Select:
+        """Запрос объявления по идентификатору.
+
+        Дата создания берется из реестра 'AdvertisementTitle', поэтому запрос читает
+        одну секцию таблицы, а не индексы всех секций, как session.get.
+        """
+        created_at = (
+            sq.select(AdvertisementTitle.created_at)
+            .where(AdvertisementTitle.id_advertisement == id)
+            .scalar_subquery()
+        )
+        return sq.select(cls).where(cls.id == id, cls.created_at == created_at)
+
+
+class AdvertisementTitle(Base):
+    """Модель таблицы 'AdvertisementTitle' - реестра заголовков объявлений.
+
+    Уникальное ограничение секционированной таблицы должно включать ключ секционирования,
+    поэтому уникальность заголовков обеспечивается этой таблицей. Записи создаются,
+    изменяются и удаляются триггером таблицы 'Advertisement'; 'created_at' - ключ
+    секции объявления для поиска по 'id_advertisement'.
+    """
+
+    __tablename__ = "AdvertisementTitle"
+
+    title: Mapped[str] = mapped_column(sq.String(50), primary_key=True)
+    id_advertisement: Mapped[int] = mapped_column(sq.Integer, index=True)
+    created_at: Mapped[datetime] = mapped_column(sq.DateTime)
+
+    def __str__(self):
+        return f"{self.__tablename__}: {self.title}"
+
+
+class UserStats(Base):
+    """Модель таблицы 'UserStats' со статистикой объявлений пользователя.
+
+    Поддерживается инкрементально при создании, изменении и удалении объявлений
+    (см. server.stats), полностью пересчитывается командой 'flask stats rebuild'.
+    """
+
+    __tablename__ = "UserStats"
+
+    id_user: Mapped[int] = mapped_column(
+        sq.Integer, sq.ForeignKey(User.id, ondelete="CASCADE"), primary_key=True
+    )
+    advertisements_count: Mapped[int] = mapped_column(sq.Integer, server_default="0")
+    first_posted_at: Mapped[datetime | None] = mapped_column(sq.DateTime)
+    last_posted_at: Mapped[datetime | None] = mapped_column(sq.DateTime)
+    last_updated_at: Mapped[datetime | None] = mapped_column(sq.DateTime)
+
+    def __str__(self):
+        return f"{self.__tablename__}: {self.id_user}"
+
+    @property
+    def as_dict(self):
+        return {
+            "id_user": self.id_user,
+            "advertisements_count": self.advertisements_count,
+            "first_posted_at": self.first_posted_at and self.first_posted_at.isoformat(),
+            "last_posted_at": self.last_posted_at and self.last_posted_at.isoformat(),
+            "last_updated_at": self.last_updated_at and self.last_updated_at.isoformat(),
+        }
+
+
+class IdempotencyKey(Base):
+    """Модель таблицы 'IdempotencyKey' с сохраненными ответами на POST-запросы.
+
+    Записи действительны IDEMPOTENCY_KEY_TTL секунд (см. server.idempotency).
+    """
+
+    __tablename__ = "IdempotencyKey"
+
+    key: Mapped[str] = mapped_column(sq.String(255), primary_key=True)
+    scope: Mapped[str] = mapped_column(sq.String(255), primary_key=True)
+    fingerprint: Mapped[str] = mapped_column(sq.String(64))
+    status_code: Mapped[int] = mapped_column(sq.Integer)
+    content_type: Mapped[str] = mapped_column(sq.String(100))
+    body: Mapped[bytes] = mapped_column(sq.LargeBinary)
+    created_at: Mapped[datetime] = mapped_column(
+        sq.DateTime, server_default=sq.func.now(), index=True
+    )
+
+    def __str__(self):
+        return f"{self.__tablename__}: {self.scope} {self.key}"
+
+
+class Tombstone(Base):
+    """Модель таблицы 'Tombstone' с записями об удаленных пользователях и объявлениях.
+
+    Используется синхронизацией клиентов (см. server.sync), записи действительны
+    SYNC_TOMBSTONE_TTL секунд.
+    """
+
+    __tablename__ = "Tombstone"
+
+    id: Mapped[int] = mapped_column(sq.BigInteger, primary_key=True)
+    model: Mapped[str] = mapped_column(sq.String(50))
+    object_id: Mapped[int] = mapped_column(sq.Integer)
+    deleted_at: Mapped[datetime] = mapped_column(
+        sq.DateTime, server_default=sq.func.now(), index=True
+    )
+
+    def __str__(self):
+        return f"{self.__tablename__}: {self.model} {self.object_id}"
@@ -0,0 +1,128 @@
+import threading
+import time
+
+import sqlalchemy as sq
+from flask import Response, current_app, request
+
+from server.exceptions import HttpError
+
+TOTAL_MODES = ("exact", "estimated", "off")
+
+
+class CountCache:
+    """Потокобезопасный кэш точных количеств записей с ограниченным временем жизни."""
+
+    def __init__(self, max_size: int = 1024) -> None:
+        self.max_size = max_size
+        self._data: dict[tuple, tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> int | None:
+        with self._lock:
+            item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            return None
+        return item[1]
+
+    def set(self, key: tuple, value: int, ttl: float) -> None:
+        with self._lock:
+            if len(self._data) >= self.max_size:
+                self._data.clear()
+            self._data[key] = (time.monotonic() + ttl, value)
+
+
+exact_counts = CountCache()
+
+
+def _get_non_negative_arg(name: str) -> int | None:
+    value = request.args.get(name)
+    if value is None:
+        return None
+    if not value.isdigit():
+        raise HttpError(400, f"Query parameter '{name}' must be a non-negative integer")
+    return int(value)
+
+
+def paginate(query: sq.Select, model) -> sq.Select:
+    """Функция применения к запросу параметров пагинации 'limit' и 'offset'.
+
+    При наличии параметров результаты упорядочиваются по первичному ключу,
+    чтобы страницы не пересекались.
+    """
+    limit = _get_non_negative_arg("limit")
+    offset = _get_non_negative_arg("offset")
+    if limit is None and offset is None:
+        return query
+    return query.order_by(*model.__mapper__.primary_key).limit(limit).offset(offset)
+
+
+def _count_exact(session: sq.orm.Session, query: sq.Select) -> int:
+    compiled = query.compile(dialect=session.bind.dialect)
+    key = (str(session.bind.url), str(compiled), tuple(sorted(compiled.params.items())))
+    total = exact_counts.get(key)
+    if total is None:
+        total = session.scalar(sq.select(sq.func.count()).select_from(query.subquery()))
+        exact_counts.set(key, total, current_app.config["LIST_TOTAL_CACHE_TTL"])
+    return total
+
+
+def _estimate_from_statistics(session: sq.orm.Session, model) -> int | None:
+    """Оценка количества записей таблицы по статистике планировщика.
+
+    Как и планировщик, масштабирует pg_class.reltuples на текущий размер таблицы.
+    Для секционированной таблицы оценки секций суммируются. Возвращает None,
+    если непустая таблица или секция еще ни разу не анализировалась.
+    """
+    table_name = session.bind.dialect.identifier_preparer.format_table(model.__table__)
+    query = sq.text(
+        "SELECT CASE WHEN bool_or(s.rows IS NULL) THEN NULL ELSE sum(s.rows)::bigint END "
+        "FROM (SELECT CASE WHEN pg_relation_size(c.oid) = 0 THEN 0 "
+        "WHEN c.reltuples < 0 OR c.relpages = 0 THEN NULL "
+        "ELSE c.reltuples / c.relpages "
+        "* (pg_relation_size(c.oid) / current_setting('block_size')::int) END AS rows "
+        "FROM pg_class c WHERE c.relkind = 'r' AND (c.oid = to_regclass(:table_name) "
+        "OR c.oid IN (SELECT i.inhrelid FROM pg_inherits i "
+        "WHERE i.inhparent = to_regclass(:table_name)))) s"
+    )
+    return session.scalar(query, {"table_name": table_name})
+
+
+def _estimate_from_plan(session: sq.orm.Session, query: sq.Select) -> int:
+    """Оценка количества строк результата запроса по плану EXPLAIN."""
+    compiled = query.compile(dialect=session.bind.dialect)
+    result = session.connection().exec_driver_sql(
+        f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+    )
+    return int(result.scalar()[0]["Plan"]["Plan Rows"])
+
+
+def count_total(session: sq.orm.Session, query: sq.Select, model) -> tuple[int, str] | None:
+    """Функция подсчета общего количества записей списка без учета пагинации.
+
+    Режим выбирается параметром запроса 'total' (по умолчанию LIST_TOTAL_MODE):
+        exact - точное количество, кэшируемое на LIST_TOTAL_CACHE_TTL секунд;
+        estimated - оценка по статистике PostgreSQL без чтения таблицы;
+        off - количество не подсчитывается.
+    Возвращает пару (количество, режим) или None.
+    """
+    mode = request.args.get("total", current_app.config["LIST_TOTAL_MODE"])
+    if mode not in TOTAL_MODES:
+        raise HttpError(400, f"Query parameter 'total' must be one of {', '.join(TOTAL_MODES)}")
+    if mode == "exact":
+        return _count_exact(session, query), mode
+    if mode == "estimated":
+        total = None
+        if query.whereclause is None:
+            total = _estimate_from_statistics(session, model)
+        if total is None:
+            total = _estimate_from_plan(session, query)
+        return total, mode
+    return None
+
+
+def set_total_headers(response: Response, total: tuple[int, str] | None) -> Response:
+    """Функция добавления в ответ заголовков X-Total-Count и X-Total-Count-Type."""
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total[0])
+        response.headers["X-Total-Count-Type"] = total[1]
+    return response
@@ -0,0 +1,128 @@
+"""Секции таблицы 'Advertisement' по месяцам 'created_at'.
+
+Секции создаются заранее SQL-функцией advertisement_ensure_partitions
+(см. миграцию f7f916cdf3bc): при запуске контейнера и приложением перед
+первым созданием объявления в каждом месяце. Старые секции отсоединяются
+от таблицы без блокировки запросов и переносятся в схему 'archive': они
+перестают участвовать в запросах и обслуживании таблицы, а удаляются
+при необходимости целиком, без DELETE.
+"""
+
+import threading
+from collections.abc import Iterator
+from datetime import datetime
+
+import sqlalchemy as sq
+
+from server import stats
+from server.models import Database
+
+ARCHIVE_SCHEMA = "archive"
+NAME_PREFIX = "Advertisement_"
+NAME_FORMAT = "%Y_%m"
+
+_ensured: set[tuple[int, int, int]] = set()
+_ensured_lock = threading.Lock()
+
+
+def _next_month(month: datetime) -> datetime:
+    return month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+
+def ensure_partitions(session: sq.orm.Session, months_ahead: int) -> int:
+    """Создание секций с текущего месяца на months_ahead месяцев вперед.
+
+    Возвращает количество созданных секций.
+    """
+    return session.scalar(sq.select(sq.func.advertisement_ensure_partitions(months_ahead)))
+
+
+def ensure_current_partitions(database: Database, months_ahead: int) -> None:
+    """Создание секций перед вставкой объявлений не чаще раза в месяц на процесс.
+
+    Выполняется в отдельной транзакции, чтобы откат запроса не отменял создание.
+    Создается не менее одной секции вперед, поэтому расхождение часов приложения
+    и базы данных на границе месяца не приводит к ошибке вставки.
+    """
+    now = datetime.now()
+    key = (id(database), now.year, now.month)
+    if key in _ensured:
+        return
+    with _ensured_lock:
+        if key in _ensured:
+            return
+        with database.engine.begin() as connection:
+            connection.execute(
+                sq.select(sq.func.advertisement_ensure_partitions(max(months_ahead, 1)))
+            )
+        _ensured.add(key)
+
+
+def list_partitions(session: sq.orm.Session) -> list[tuple[str, datetime]]:
+    """Список присоединенных секций: имя и первый день месяца, по возрастанию."""
+    names = session.scalars(
+        sq.text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = '\"Advertisement\"'::regclass ORDER BY c.relname"
+        )
+    )
+    return [
+        (name, datetime.strptime(name.removeprefix(NAME_PREFIX), NAME_FORMAT)) for name in names
+    ]
+
+
+def _archive_candidates(session: sq.orm.Session) -> list[tuple[str, str]]:
+    """Секции и отсоединенные, но не перенесенные в архив таблицы с их состоянием.
+
+    attached - присоединена; pending - отсоединение CONCURRENTLY прервано;
+    detached - отсоединена, перенос в архив прерван.
+    """
+    return session.execute(
+        sq.text(
+            "SELECT c.relname, CASE WHEN i.inhrelid IS NULL THEN 'detached' "
+            "WHEN i.inhdetachpending THEN 'pending' ELSE 'attached' END "
+            "FROM pg_class c LEFT JOIN pg_inherits i ON i.inhrelid = c.oid "
+            "AND i.inhparent = '\"Advertisement\"'::regclass "
+            "WHERE c.relnamespace = current_schema()::regnamespace AND c.relkind = 'r' "
+            "AND c.relname ~ :pattern ORDER BY c.relname"
+        ),
+        {"pattern": f"^{NAME_PREFIX}[0-9]{{4}}_[0-9]{{2}}$"},
+    ).all()
+
+
+def archive_partitions(database: Database, before: datetime) -> Iterator[str]:
+    """Генератор переноса в архив секций, все объявления которых созданы раньше before.
+
+    Секция отсоединяется командой DETACH PARTITION CONCURRENTLY вне транзакции,
+    не блокируя чтение и изменение объявлений. Затем в отдельной транзакции
+    освобождаются заголовки архивных объявлений, пересчитывается статистика
+    их владельцев и таблица переносится в схему 'archive'. Прерванный перенос
+    завершается при следующем запуске. Возвращает имена перенесенных секций.
+    """
+    with database() as session:
+        candidates = _archive_candidates(session)
+    for name, state in candidates:
+        month = datetime.strptime(name.removeprefix(NAME_PREFIX), NAME_FORMAT)
+        if state != "detached" and _next_month(month) > before:
+            continue
+        if state != "detached":
+            mode = "FINALIZE" if state == "pending" else "CONCURRENTLY"
+            with database.engine.connect().execution_options(
+                isolation_level="AUTOCOMMIT"
+            ) as connection:
+                connection.execute(
+                    sq.text(f'ALTER TABLE "Advertisement" DETACH PARTITION "{name}" {mode}')
+                )
+        with database() as session:
+            session.execute(sq.text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+            user_ids = session.scalars(
+                sq.text(
+                    f'DELETE FROM "AdvertisementTitle" t USING "{name}" a '
+                    "WHERE t.title = a.title AND t.id_advertisement = a.id RETURNING a.id_user"
+                )
+            ).all()
+            session.execute(sq.text(f'ALTER TABLE "{name}" SET SCHEMA {ARCHIVE_SCHEMA}'))
+            if user_ids:
+                stats.rebuild(session, set(user_ids))
+            session.commit()
+        yield name
@@ -2,9 +2,9 @@ import functools
 from datetime import datetime, timedelta, timezone
 
 import jwt
-from flask import Request, request
+from flask import Request, current_app, request
 
-from server.config import SECRET_KEY
+from server import profiling
 from server.exceptions import HttpError
 from server.models import User
 
@@ -18,7 +18,7 @@ def encode_token(user: User) -> dict:
     expiration_time = datetime.now(tz=timezone.utc) + timedelta(minutes=60)
     auth_token: str = jwt.encode(
         {"id": user.id, "exp": expiration_time},
-        SECRET_KEY,
+        current_app.config["SECRET_KEY"],
         algorithm="HS256",
     )
     return {"auth_token": auth_token}
@@ -30,23 +30,22 @@ def _decode_token(token: str) -> dict:
     Возвращает зашифрованные данные - словарь с идентификатором пользователя.
     """
     try:
-        return jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        return jwt.decode(token, current_app.config["SECRET_KEY"], algorithms=["HS256"])
     except (jwt.exceptions.DecodeError, jwt.exceptions.ExpiredSignatureError):
         raise HttpError(401, "The provided authorization token is invalid")
 
 
-def _check_permissions_for_advertisement(is_owner: bool, kwargs: dict) -> None:
+def _check_permissions_for_advertisement(view_class, is_owner: bool, kwargs: dict) -> None:
     if request.is_authenticated:
         if is_owner and kwargs:
-            for advertisement in request.user.advertisements:
-                if advertisement.id == kwargs["id"]:
-                    return
+            if view_class.get_obj(kwargs["id"]).id_user == request.user.id:
+                return
             raise HttpError(403, "You can only make changes to your own advertisements")
     else:
         raise HttpError(401, "Authorization credentials were not provided")
 
 
-def _check_permissions_for_user(is_owner: bool, kwargs: dict) -> None:
+def _check_permissions_for_user(view_class, is_owner: bool, kwargs: dict) -> None:
     if request.is_authenticated:
         if is_owner and kwargs:
             if request.user.id == kwargs["id"]:
@@ -65,12 +64,15 @@ def check_authentication(request: Request):
         request.user = <server.models.User object ...>;
     Если токен не предоставлен:
         request.is_authenticated = False;
-    Если предоставлен невалидный токен возвращается 401 HTTP-ответ.
+    Если предоставлен невалидный токен или токен удаленного (удаляемого)
+    пользователя возвращается 401 HTTP-ответ.
     """
     request.is_authenticated = False
     if request.authorization and request.authorization.token:
         user_info: dict = _decode_token(request.authorization.token)
-        user: User = request.session.get(User, user_info["id"])
+        user: User | None = request.session.get(User, user_info["id"])
+        if user is None or user.deletion_requested_at is not None:
+            raise HttpError(401, "The provided authorization token is invalid")
         request.user = user
         request.is_authenticated = True
     return request
@@ -83,6 +85,7 @@ def authentication(is_auth: bool, is_owner: bool = False):
     :is_owner: пользователь должен являться владельцем запрашиваемого ресурса.
 
     В зависимости от выбранных опций, при их невыполнении возвращаются 401 или 403 HTTP-ответ.
+    Проверка прав отмечается для семплера фазой 'auth' (см. server.profiling).
     """
 
     def decorator(old_method):
@@ -94,7 +97,8 @@ def authentication(is_auth: bool, is_owner: bool = False):
         @functools.wraps(old_method)
         def new_method(view_class, *args, **kwargs):
             if any([is_auth, is_owner]):
-                handlers[view_class.model.__tablename__](is_owner, kwargs)
+                with profiling.label(phase="auth"):
+                    handlers[view_class.model.__tablename__](view_class, is_owner, kwargs)
             response = old_method(view_class, *args, **kwargs)
             return response
 
@@ -0,0 +1,156 @@
+"""Профилирование работающего воркера по запросу.
+
+Выключено, пока не задана переменная окружения PROFILING_TOKEN. Запросы
+к /profiling и запросы с заголовком X-Profile передают этот токен в заголовке
+X-Profiling-Token.
+
+Семплер (GET /profiling/sample) в течение заданного времени снимает стеки
+всех потоков процесса через sys._current_frames и возвращает их в формате
+collapsed stacks (flamegraph.pl, speedscope). Запрос с заголовком X-Profile
+выполняется под cProfile, результат сохраняется в формате pstats и доступен
+по идентификатору из заголовка ответа X-Profile-Id.
+
+Чтобы стеки можно было отнести к маршрутам, обработчики запросов отмечают
+поток маршрутом и фазой (см. BaseView.dispatch_request и server.permissions.authentication).
+Отметка - запись в словарь по идентификатору потока, поэтому без запущенного
+семплера профилирование почти ничего не стоит.
+"""
+
+import collections
+import contextlib
+import cProfile
+import hmac
+import os
+import sys
+import threading
+import time
+import uuid
+from collections.abc import Iterator
+
+from flask import Request
+
+from server.exceptions import HttpError
+
+# Маршрут и фаза обработки запроса по идентификатору потока.
+_labels: dict[int, tuple[str, str]] = {}
+
+_sampler_lock = threading.Lock()
+# cProfile с Python 3.12 использует sys.monitoring: в процессе активен только один профилировщик.
+_profiler_lock = threading.Lock()
+
+
+def check_token(request: Request, token: str | None) -> None:
+    """Проверка токена профилирования: 404, если профилирование выключено, иначе 403."""
+    if not token:
+        raise HttpError(404, "Profiling is disabled")
+    provided = request.headers.get("X-Profiling-Token", "")
+    if not hmac.compare_digest(provided.encode(), token.encode()):
+        raise HttpError(403, "The provided profiling token is invalid")
+
+
+@contextlib.contextmanager
+def label(route: str | None = None, phase: str = "view") -> Iterator[None]:
+    """Контекстный менеджер отметки текущего потока маршрутом и фазой обработки.
+
+    Без маршрута используется маршрут внешней отметки.
+    """
+    ident = threading.get_ident()
+    previous = _labels.get(ident)
+    if route is None:
+        route = previous[0] if previous else "-"
+    _labels[ident] = (route, phase)
+    try:
+        yield
+    finally:
+        if previous is None:
+            _labels.pop(ident, None)
+        else:
+            _labels[ident] = previous
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample(seconds: float, interval: float) -> dict[str, int]:
+    """Снятие стеков потоков процесса каждые interval секунд в течение seconds секунд.
+
+    Возвращает количество снимков каждого стека. Стек начинается с маршрута и фазы
+    отмеченного потока или с имени неотмеченного. Поток семплера не учитывается.
+    Одновременно в процессе работает один семплер, иначе возвращается 409 HTTP-ответ.
+    """
+    if not _sampler_lock.acquire(blocking=False):
+        raise HttpError(409, "The sampler is already running in this worker")
+    try:
+        own = threading.get_ident()
+        counts: collections.Counter = collections.Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                labels = _labels.get(ident)
+                root = list(labels) if labels else [names.get(ident, str(ident))]
+                counts[";".join(part.replace(";", ",") for part in root + stack[::-1])] += 1
+            time.sleep(interval)
+        return dict(counts)
+    finally:
+        _sampler_lock.release()
+
+
+def format_collapsed(counts: dict[str, int]) -> str:
+    """Форматирование стеков в формате collapsed stacks: 'кадр;кадр;... количество'."""
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(counts.items()))
+
+
+@contextlib.contextmanager
+def profile(directory: str, max_profiles: int) -> Iterator[str]:
+    """Контекстный менеджер профилирования блока cProfile.
+
+    Возвращает идентификатор профиля; профиль сохраняется в directory в формате pstats
+    при выходе из блока, в том числе по исключению. Хранятся max_profiles последних
+    профилей. Одновременно в процессе профилируется один запрос, иначе 409 HTTP-ответ.
+    """
+    if not _profiler_lock.acquire(blocking=False):
+        raise HttpError(409, "Another request is being profiled in this worker")
+    try:
+        profile_id = uuid.uuid4().hex
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield profile_id
+        finally:
+            profiler.disable()
+            os.makedirs(directory, exist_ok=True)
+            profiler.dump_stats(os.path.join(directory, f"{profile_id}.pstats"))
+            _remove_old_profiles(directory, max_profiles)
+    finally:
+        _profiler_lock.release()
+
+
+def _remove_old_profiles(directory: str, max_profiles: int) -> None:
+    paths = [entry.path for entry in os.scandir(directory) if entry.name.endswith(".pstats")]
+    if len(paths) <= max_profiles:
+        return
+    paths.sort(key=os.path.getmtime)
+    for path in paths[: len(paths) - max_profiles]:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+
+def get_profile_path(directory: str, profile_id: str) -> str:
+    """Путь к сохраненному профилю; 404 HTTP-ответ, если профиля нет."""
+    try:
+        profile_id = uuid.UUID(hex=profile_id).hex
+    except ValueError:
+        raise HttpError(404, "Profile not found")
+    path = os.path.join(directory, f"{profile_id}.pstats")
+    if not os.path.exists(path):
+        raise HttpError(404, "Profile not found")
+    return path
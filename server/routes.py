@@ -1,7 +1,26 @@
-from server.views import AdvertisementView, Flask, UserView, app
+from flask import Flask
+from werkzeug.exceptions import RequestEntityTooLarge
 
+from server.exceptions import HttpError
+from server.views import (
+    AdvertisementView,
+    advertisement_stream,
+    UserView,
+    after_request,
+    before_request,
+    error_handler,
+    export_objects,
+    login,
+    profiling_profile,
+    profiling_sample,
+    request_too_large_handler,
+    sync_changes,
+    teardown_request,
+    user_stats,
+)
 
-def register_url(view_class: UserView | AdvertisementView, name: str, app: Flask = app) -> None:
+
+def register_url(view_class: UserView | AdvertisementView, name: str, app: Flask) -> None:
     """Функция регистрации URL всех стандартных REST API методов,
     описанных в class-based views.
     """
@@ -13,5 +32,24 @@ def register_url(view_class: UserView | AdvertisementView, name: str, app: Flask
     )
 
 
-register_url(AdvertisementView, "advertisement")
-register_url(UserView, "user")
+def register_routes(app: Flask) -> None:
+    """Функция регистрации обработчиков запросов, ошибок и всех URL приложения."""
+    app.before_request(before_request)
+    app.after_request(after_request)
+    app.teardown_request(teardown_request)
+    app.register_error_handler(HttpError, error_handler)
+    app.register_error_handler(RequestEntityTooLarge, request_too_large_handler)
+
+    register_url(AdvertisementView, "advertisement", app)
+    app.add_url_rule("/advertisement/stream", view_func=advertisement_stream, methods=["GET"])
+    register_url(UserView, "user", app)
+    app.add_url_rule("/user/<int:id>/stats", view_func=user_stats, methods=["GET"])
+    app.add_url_rule(
+        "/<any(advertisement, user):name>/export", view_func=export_objects, methods=["GET"]
+    )
+    app.add_url_rule("/login", view_func=login, methods=["POST", "PATCH"])
+    app.add_url_rule("/sync", view_func=sync_changes, methods=["GET"])
+    app.add_url_rule("/profiling/sample", view_func=profiling_sample, methods=["GET"])
+    app.add_url_rule(
+        "/profiling/profiles/<profile_id>", view_func=profiling_profile, methods=["GET"]
+    )
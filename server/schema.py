@@ -1,60 +1,93 @@
 import re
-from typing import ClassVar
-
-from pydantic import BaseModel, ValidationError, field_validator
+from typing import Annotated
+
+from pydantic import (
+    AfterValidator,
+    ConfigDict,
+    StringConstraints,
+    TypeAdapter,
+    ValidationError,
+    with_config,
+)
+from typing_extensions import TypedDict
 
 from server.exceptions import HttpError
+from server.models import Advertisement, User
+
+PASSWORD_PATTERN = re.compile(r"^(?=.*\d)(?=.*[a-z])(?=.*[A-Z])(?!.*\s).*$")
 
 
-class BaseUser(BaseModel):
-    username: str
-    password: str
+def validate_password(value: str) -> str:
+    if PASSWORD_PATTERN.fullmatch(value):
+        return value
+    raise ValueError(
+        "The password too simple. It must contain " "numbers, uppercase and lowercase letters."
+    )
 
-    password_pattern: ClassVar = re.compile(r"^(?=.*\d)(?=.*[a-z])(?=.*[A-Z])(?!.*\s).*$")
 
-    @field_validator("password")
-    @classmethod
-    def validate_password(cls, value: str) -> str:
-        result = cls.password_pattern.fullmatch(value)
-        if result:
-            return value
-        raise ValueError(
-            "The password too simple. It must contain " "numbers, uppercase and lowercase letters."
-        )
+# Ограничения длины совпадают с размерами колонок моделей, поэтому слишком
+# длинные значения отклоняются до обращения к базе данных.
+Username = Annotated[str, StringConstraints(max_length=User.username.type.length)]
+Password = Annotated[str, AfterValidator(validate_password)]
+Title = Annotated[str, StringConstraints(max_length=Advertisement.title.type.length)]
 
 
-class CreateUser(BaseUser):
-    pass
+@with_config(ConfigDict(defer_build=True))
+class CreateUser(TypedDict):
+    username: Username
+    password: Password
 
 
-class UpdateUser(BaseUser):
-    username: str | None = None
-    password: str | None = None
+@with_config(ConfigDict(defer_build=True))
+class UpdateUser(TypedDict, total=False):
+    username: Username
+    password: Password
 
 
-class BaseAdvertisement(BaseModel):
-    title: str
+@with_config(ConfigDict(defer_build=True))
+class CreateAdvertisement(TypedDict):
+    title: Title
     text: str
 
 
-class CreateAdvertisement(BaseAdvertisement):
-    pass
+@with_config(ConfigDict(defer_build=True))
+class UpdateAdvertisement(TypedDict, total=False):
+    title: Title
+    text: str
 
 
-class UpdateAdvertisement(BaseAdvertisement):
-    title: str | None = None
-    text: str | None = None
+_adapters: dict[type, TypeAdapter] = {
+    schema: TypeAdapter(schema)
+    for schema in (CreateUser, UpdateUser, CreateAdvertisement, UpdateAdvertisement)
+}
+
+# Ошибки недавно отклоненных небольших тел запросов: повторная отправка того же
+# некорректного запроса (например, повтор клиента) не разбирается заново.
+# Тела запросов пользователей содержат пароли и в памяти не сохраняются.
+_ERRORS_CACHE_SCHEMAS = (CreateAdvertisement, UpdateAdvertisement)
+_ERRORS_CACHE_SIZE = 256
+_ERRORS_CACHE_MAX_BODY = 1024
+_errors_cache: dict[tuple[type, bytes], list[dict]] = {}
 
 
 def validate(
     schema: CreateUser | UpdateUser | CreateAdvertisement | UpdateAdvertisement,
-    input_data: dict,
-):
+    body: bytes,
+) -> dict:
+    """Функция разбора и валидации тела запроса за один проход.
+
+    JSON разбирается и проверяется непосредственно из байтов заранее созданным
+    TypeAdapter. Возвращает словарь только с переданными полями.
+    """
+    cacheable = schema in _ERRORS_CACHE_SCHEMAS and len(body) <= _ERRORS_CACHE_MAX_BODY
+    if cacheable and (errors := _errors_cache.get((schema, body))) is not None:
+        raise HttpError(400, errors)
     try:
-        data = schema(**input_data)
-        return data.model_dump(exclude_unset=True)
+        return _adapters[schema].validate_json(body)
     except ValidationError as error:
-        errors = error.errors()
-        for error in errors:
-            error.pop("ctx", None)
+        errors = error.errors(include_url=False, include_context=False, include_input=False)
+        if cacheable:
+            if len(_errors_cache) >= _ERRORS_CACHE_SIZE:
+                _errors_cache.clear()
+            _errors_cache[(schema, body)] = errors
         raise HttpError(400, errors)
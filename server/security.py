@@ -1,3 +1,4 @@
+from flask import current_app
 from flask_bcrypt import Bcrypt
 
 
@@ -8,3 +9,14 @@ class AppBcrypt(Bcrypt):
             hashed_password: bytes = self.generate_password_hash(data["password"], **kwargs)
             data["password"] = hashed_password.decode()
         return data
+
+
+def get_bcrypt() -> AppBcrypt:
+    """Функция получения экземпляра AppBcrypt текущего приложения.
+
+    Экземпляр создается при первом обращении и сохраняется в расширениях приложения.
+    """
+    bcrypt: AppBcrypt | None = current_app.extensions.get("bcrypt")
+    if bcrypt is None:
+        bcrypt = current_app.extensions.setdefault("bcrypt", AppBcrypt(app=current_app))
+    return bcrypt
@@ -0,0 +1,116 @@
+"""Инкрементальное обновление статистики объявлений пользователей.
+
+Функции выполняются в транзакции изменения объявления, поэтому статистика
+фиксируется или откатывается вместе с ним. Чтение статистики - один запрос
+по первичному ключу таблицы 'UserStats' вместо агрегации объявлений.
+"""
+
+from collections.abc import Iterable
+
+import sqlalchemy as sq
+from sqlalchemy.dialects.postgresql import insert
+
+from server.models import Advertisement, UserStats
+
+
+def advertisement_created(session: sq.orm.Session, advertisement: Advertisement) -> None:
+    """Учет нового объявления.
+
+    now() совпадает со значением по умолчанию 'created_at' в той же транзакции.
+    """
+    query = insert(UserStats).values(
+        id_user=advertisement.user.id,
+        advertisements_count=1,
+        first_posted_at=sq.func.now(),
+        last_posted_at=sq.func.now(),
+        last_updated_at=sq.func.now(),
+    )
+    query = query.on_conflict_do_update(
+        index_elements=[UserStats.id_user],
+        set_={
+            "advertisements_count": UserStats.advertisements_count + 1,
+            "first_posted_at": sq.func.coalesce(
+                UserStats.first_posted_at, query.excluded.first_posted_at
+            ),
+            "last_posted_at": query.excluded.last_posted_at,
+            "last_updated_at": query.excluded.last_updated_at,
+        },
+    )
+    session.execute(query)
+
+
+def advertisement_updated(session: sq.orm.Session, advertisement: Advertisement) -> None:
+    """Учет изменения объявления."""
+    query = (
+        sq.update(UserStats)
+        .where(UserStats.id_user == advertisement.id_user)
+        .values(last_updated_at=sq.func.now())
+    )
+    session.execute(query)
+
+
+def advertisement_deleted(session: sq.orm.Session, advertisement: Advertisement) -> None:
+    """Учет удаления объявления.
+
+    Даты первой и последней публикации пересчитываются по индексу
+    (id_user, created_at) без учета удаляемого объявления.
+    """
+    remaining = sq.select(Advertisement.created_at).where(
+        Advertisement.id_user == advertisement.id_user, Advertisement.id != advertisement.id
+    )
+    query = (
+        sq.update(UserStats)
+        .where(UserStats.id_user == advertisement.id_user)
+        .values(
+            advertisements_count=UserStats.advertisements_count - 1,
+            first_posted_at=remaining.order_by(Advertisement.created_at).limit(1).scalar_subquery(),
+            last_posted_at=remaining.order_by(Advertisement.created_at.desc())
+            .limit(1)
+            .scalar_subquery(),
+        )
+    )
+    session.execute(query)
+
+
+def rebuild(session: sq.orm.Session, user_ids: Iterable[int] | None = None) -> int:
+    """Полный пересчет статистики всех или указанных пользователей.
+
+    На время пересчета таблица блокируется от инкрементальных изменений,
+    которые дождутся его завершения и применятся поверх нового состояния.
+    Возвращает количество пользователей с объявлениями.
+    """
+    session.execute(sq.text('LOCK TABLE "UserStats" IN EXCLUSIVE MODE'))
+    delete_query = sq.delete(UserStats)
+    aggregate_query = sq.select(
+        Advertisement.id_user,
+        sq.func.count(),
+        sq.func.min(Advertisement.created_at),
+        sq.func.max(Advertisement.created_at),
+        sq.func.max(Advertisement.updated_at),
+    ).group_by(Advertisement.id_user)
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        delete_query = delete_query.where(UserStats.id_user.in_(user_ids))
+        aggregate_query = aggregate_query.where(Advertisement.id_user.in_(user_ids))
+    session.execute(delete_query)
+    result = session.execute(
+        insert(UserStats).from_select(
+            [
+                UserStats.id_user,
+                UserStats.advertisements_count,
+                UserStats.first_posted_at,
+                UserStats.last_posted_at,
+                UserStats.last_updated_at,
+            ],
+            aggregate_query,
+        )
+    )
+    return result.rowcount
+
+
+def get_stats(session: sq.orm.Session, id_user: int) -> dict:
+    """Статистика пользователя; для пользователя без объявлений - нулевая."""
+    stats: UserStats | None = session.get(UserStats, id_user)
+    if stats is None:
+        stats = UserStats(id_user=id_user, advertisements_count=0)
+    return stats.as_dict
@@ -0,0 +1,79 @@
+"""Синхронизация клиентов по изменениям с момента watermark.
+
+Изменения выбираются по индексам 'updated_at' пользователей и объявлений,
+удаления - по записям таблицы 'Tombstone', поэтому объем ответа зависит
+от числа изменений, а не от размера каталога.
+
+Время изменения - начало транзакции, которая его выполнила (now()), а видимым
+изменение становится только после ее фиксации. Поэтому watermark - не текущее
+время, а начало самой старой открытой транзакции: все изменения до него уже
+зафиксированы, и следующий запрос с since=watermark не пропустит ни одного.
+Изменения выбираются в полуинтервале [since, watermark). Начало транзакций
+других соединений видно в pg_stat_activity, если они выполняются под той же
+ролью базы данных, что и приложение.
+"""
+
+from datetime import datetime
+
+import sqlalchemy as sq
+
+from server.models import Advertisement, Tombstone, User
+
+
+def _expiration_time(ttl: int) -> sq.ColumnElement:
+    return sq.func.now() - sq.func.make_interval(0, 0, 0, 0, 0, 0, ttl)
+
+
+def add_tombstone(session: sq.orm.Session, obj: User | Advertisement) -> None:
+    """Запись об удалении объекта в транзакции сессии.
+
+    Удаление пользователя означает удаление и всех его объявлений,
+    отдельные записи для них не создаются.
+    """
+    session.add(Tombstone(model=obj.__tablename__, object_id=obj.id))
+
+
+def get_watermark(session: sq.orm.Session) -> datetime:
+    """Время, до которого все изменения уже зафиксированы."""
+    return session.scalar(
+        sq.text(
+            "SELECT least(localtimestamp, min(xact_start)::timestamp) FROM pg_stat_activity "
+            "WHERE datname = current_database() AND backend_type = 'client backend' "
+            "AND pid <> pg_backend_pid()"
+        )
+    )
+
+
+def get_changes(session: sq.orm.Session, since: datetime, watermark: datetime) -> dict:
+    """Изменения пользователей и объявлений и удаления в полуинтервале [since, watermark)."""
+    users = sq.select(User).where(
+        User.updated_at >= since,
+        User.updated_at < watermark,
+        User.deletion_requested_at.is_(None),
+    )
+    advertisements = sq.select(Advertisement).where(
+        Advertisement.updated_at >= since, Advertisement.updated_at < watermark
+    )
+    tombstones = sq.select(Tombstone.model, Tombstone.object_id).where(
+        Tombstone.deleted_at >= since, Tombstone.deleted_at < watermark
+    )
+    deleted: dict[str, list[int]] = {User.__tablename__: [], Advertisement.__tablename__: []}
+    for model, object_id in session.execute(tombstones.order_by(Tombstone.id)):
+        deleted[model].append(object_id)
+    return {
+        "users": [user.as_dict for user in session.scalars(users.order_by(User.id))],
+        "advertisements": [
+            advertisement.as_dict
+            for advertisement in session.scalars(advertisements.order_by(Advertisement.id))
+        ],
+        "deleted": {
+            "users": deleted[User.__tablename__],
+            "advertisements": deleted[Advertisement.__tablename__],
+        },
+    }
+
+
+def delete_expired(connection: sq.Connection, ttl: int) -> int:
+    """Функция удаления просроченных записей об удалениях. Возвращает количество удаленных."""
+    query = sq.delete(Tombstone).where(Tombstone.deleted_at < _expiration_time(ttl))
+    return connection.execute(query).rowcount
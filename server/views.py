@@ -1,10 +1,16 @@
+import os
+from datetime import datetime, timedelta
+
 import sqlalchemy as sq
-from flask import Flask, Response, jsonify, request
+from flask import Response, current_app, jsonify, request, send_file, stream_with_context
 from flask.views import MethodView
+from werkzeug.exceptions import RequestEntityTooLarge
 
-from server.config import SECRET_KEY
+from server import bulk, deletion, events, partitions, profiling, stats, sync
 from server.exceptions import HttpError
-from server.models import Advertisement, Session, User
+from server.idempotency import idempotent, save_response
+from server.models import Advertisement, User, UserStats, pipeline
+from server.pagination import count_total, paginate, set_total_headers
 from server.permissions import authentication, check_authentication, encode_token
 from server.schema import (
     CreateAdvertisement,
@@ -13,32 +19,71 @@ from server.schema import (
     UpdateUser,
     validate,
 )
-from server.security import AppBcrypt
-
-app = Flask(__name__)
-app.secret_key = SECRET_KEY
-bcrypt = AppBcrypt(app=app)
+from server.security import get_bcrypt
 
 
-@app.before_request
 def before_request():
-    request.session = Session()
+    request.session = current_app.extensions["database"]()
+    if (request.content_length or 0) > current_app.config["MAX_CONTENT_LENGTH"]:
+        raise HttpError(413, "Request body is too large")
     check_authentication(request)
 
 
-@app.after_request
 def after_request(response: Response):
     request.session.close()
+    profile_id: str | None = getattr(request, "profile_id", None)
+    if profile_id is not None:
+        response.headers["X-Profile-Id"] = profile_id
     return response
 
 
-@app.errorhandler(HttpError)
+def teardown_request(error: BaseException | None = None) -> None:
+    """Закрытие сессии запроса, завершившегося необработанным исключением.
+
+    after_request в этом случае не вызывается, и открытая транзакция
+    удерживала бы блокировки строк.
+    """
+    session = getattr(request, "session", None)
+    if session is not None:
+        session.close()
+
+
 def error_handler(error: HttpError):
     error_response = jsonify({"error": error.message})
     error_response.status_code = error.status_code
     return error_response
 
 
+def request_too_large_handler(error: RequestEntityTooLarge):
+    return error_handler(HttpError(413, "Request body is too large"))
+
+
+def _get_int_arg(name: str, default: int, minimum: int, maximum: int) -> int:
+    value = request.args.get(name)
+    if value is None:
+        return default
+    if not value.isdigit() or not minimum <= int(value) <= maximum:
+        raise HttpError(
+            400, f"Query parameter '{name}' must be an integer from {minimum} to {maximum}"
+        )
+    return int(value)
+
+
+def _get_datetime_arg(name: str) -> datetime | None:
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        result = datetime.fromisoformat(value)
+    except ValueError:
+        result = None
+    if result is None or result.tzinfo is not None:
+        raise HttpError(
+            400, f"Query parameter '{name}' must be an ISO 8601 date or time without time zone"
+        )
+    return result
+
+
 class BaseView(MethodView):
     model = None
 
@@ -49,15 +94,50 @@ class BaseView(MethodView):
             )
         super().__init__()
 
-    def commit_changes(self, obj: User | Advertisement = None) -> None:
-        """Метод фиксации состояния базы данных."""
+    def dispatch_request(self, **kwargs) -> Response:
+        """Метод вызова обработчика HTTP-метода.
+
+        Поток отмечается маршрутом запроса для семплера, запрос с заголовком X-Profile
+        выполняется под cProfile (см. server.profiling).
+        """
+        token: str | None = current_app.config["PROFILING_TOKEN"]
+        with profiling.label(f"{request.method} {request.url_rule.rule}"):
+            if not token or "X-Profile" not in request.headers:
+                return super().dispatch_request(**kwargs)
+            profiling.check_token(request, token)
+            with profiling.profile(
+                current_app.config["PROFILING_DIR"], current_app.config["PROFILING_MAX_PROFILES"]
+            ) as profile_id:
+                request.profile_id = profile_id
+                return super().dispatch_request(**kwargs)
+
+    def commit_changes(self, obj: User | Advertisement = None, response: Response = None) -> None:
+        """Метод фиксации состояния базы данных.
+
+        :response: ответ, сохраняемый в той же транзакции для запроса
+        с заголовком Idempotency-Key (см. server.idempotency).
+        """
         if obj:
             request.session.add(obj)
+        if response is not None:
+            save_response(request.session, response)
         try:
             request.session.commit()
         except sq.exc.IntegrityError:
             raise HttpError(409, f"{self.model.__tablename__}-model object already exists")
 
+    def flush_changes(self, obj: User | Advertisement = None) -> None:
+        """Метод отправки изменений в базу данных без фиксации транзакции.
+        Нарушение ограничений обнаруживается до выполнения последующих запросов.
+        """
+        if obj:
+            request.session.add(obj)
+        try:
+            request.session.flush()
+        except sq.exc.IntegrityError:
+            request.session.rollback()
+            raise HttpError(409, f"{self.model.__tablename__}-model object already exists")
+
     def get_obj(self, id: int) -> User | Advertisement:
         """Метод получения объекта модели по идентификатору."""
         obj: User | Advertisement = request.session.get(self.model, id)
@@ -71,8 +151,12 @@ class BaseView(MethodView):
         response.status_code = status_code
         return response
 
-    def _get_list_logic(self) -> list[dict]:
-        objs: list[User | Advertisement] = request.session.scalars(sq.select(self.model))
+    def _get_list_query(self) -> sq.Select:
+        """Метод формирования запроса списка записей без учета пагинации."""
+        return sq.select(self.model)
+
+    def _get_list_logic(self, query: sq.Select) -> list[dict]:
+        objs: list[User | Advertisement] = request.session.scalars(paginate(query, self.model))
         return [obj.as_dict for obj in objs]
 
     def _get_detail_logic(self, id: int) -> dict:
@@ -83,9 +167,14 @@ class BaseView(MethodView):
         """Метод обработки HTTP-метода GET.
         Возвращает пользователю список всех или конкретную запись
         из базы данных на основе переданных аргументов.
+        Список поддерживает параметры 'limit', 'offset' и 'total' (см. server.pagination).
         """
-        objs: dict | list[dict] = self._get_detail_logic(id) if id else self._get_list_logic()
-        return self.get_response(objs)
+        if id:
+            return self.get_response(self._get_detail_logic(id))
+        query: sq.Select = self._get_list_query()
+        total: tuple[int, str] | None = count_total(request.session, query, self.model)
+        response: Response = self.get_response(self._get_list_logic(query))
+        return set_total_headers(response, total)
 
     def delete(self, id: int) -> Response:
         """Метод обработки HTTP-метода DELETE.
@@ -93,6 +182,7 @@ class BaseView(MethodView):
         """
         obj: User | Advertisement = self.get_obj(id)
         request.session.delete(obj)
+        sync.add_tombstone(request.session, obj)
         self.commit_changes()
         return self.get_response(obj.as_dict, 204)
 
@@ -108,24 +198,37 @@ class UserView(BaseView):
             return request.user
         return super().get(id)
 
+    def get_obj(self, id: int) -> User:
+        """Метод получения пользователя по идентификатору без удаляемых в фоне."""
+        user: User = super().get_obj(id)
+        if user.deletion_requested_at is not None:
+            raise HttpError(404, f"{self.model.__tablename__}-model object with {id=} not found")
+        return user
+
+    def _get_list_query(self) -> sq.Select:
+        return super()._get_list_query().where(User.deletion_requested_at.is_(None))
+
     @authentication(is_auth=False)
+    @idempotent
     def post(self) -> Response:
         """Метод обработки HTTP-метода POST.
         Создает новую запись в базе данных о пользователе.
         """
-        validated_data: dict = validate(CreateUser, request.json)
-        bcrypt.hash_password(validated_data)
+        validated_data: dict = validate(CreateUser, request.get_data())
+        get_bcrypt().hash_password(validated_data)
         user: User = User(**validated_data)
-        self.commit_changes(user)
-        return self.get_response(user.as_dict, 201)
+        self.flush_changes(user)
+        response: Response = self.get_response(user.as_dict, 201)
+        self.commit_changes(response=response)
+        return response
 
     @authentication(is_auth=True, is_owner=True)
     def patch(self, id: int) -> Response:
         """Метод обработки HTTP-метода PATCH.
         Частично меняет информацию о существующем пользователе в базе данных.
         """
-        validated_data: dict = validate(UpdateUser, request.json)
-        bcrypt.hash_password(validated_data)
+        validated_data: dict = validate(UpdateUser, request.get_data())
+        get_bcrypt().hash_password(validated_data)
         user: User = self.get_obj(id)
         for field, value in validated_data.items():
             setattr(user, field, value)
@@ -134,7 +237,23 @@ class UserView(BaseView):
 
     @authentication(is_auth=True, is_owner=True)
     def delete(self, id: int) -> Response:
-        return super().delete(id)
+        """Метод обработки HTTP-метода DELETE.
+        Удаляет пользователя, объявления удаляются каскадом внешнего ключа.
+        Пользователь с числом объявлений больше USER_DELETE_ASYNC_THRESHOLD
+        удаляется в фоне частями (см. server.deletion), возвращается 202 HTTP-ответ.
+        """
+        count: int | None = request.session.scalar(
+            sq.select(UserStats.advertisements_count).where(UserStats.id_user == id)
+        )
+        if (count or 0) <= current_app.config["USER_DELETE_ASYNC_THRESHOLD"]:
+            return super().delete(id)
+        user: User = self.get_obj(id)
+        deletion.request_deletion(request.session, user)
+        self.commit_changes()
+        deletion.schedule(
+            current_app.extensions["database"], id, current_app.config["USER_DELETE_CHUNK_SIZE"]
+        )
+        return self.get_response(user.as_dict, 202)
 
 
 class AdvertisementView(BaseView):
@@ -146,37 +265,179 @@ class AdvertisementView(BaseView):
     def get(self, id: int = None) -> Response:
         return super().get(id)
 
+    def get_obj(self, id: int) -> Advertisement:
+        """Метод получения объявления по идентификатору из одной секции таблицы."""
+        identity_key = request.session.identity_key(Advertisement, id)
+        obj: Advertisement | None = request.session.identity_map.get(identity_key)
+        if obj is None:
+            obj = request.session.scalar(Advertisement.select_by_id(id))
+        if obj is None:
+            raise HttpError(404, f"{self.model.__tablename__}-model object with {id=} not found")
+        return obj
+
+    def _get_list_query(self) -> sq.Select:
+        """Метод формирования запроса списка объявлений.
+
+        Параметры 'created_from' (включительно) и 'created_to' (не включительно)
+        ограничивают период создания объявлений, и запрос читает только секции
+        таблицы за этот период.
+        """
+        query = super()._get_list_query()
+        created_from = _get_datetime_arg("created_from")
+        created_to = _get_datetime_arg("created_to")
+        if created_from is not None:
+            query = query.where(Advertisement.created_at >= created_from)
+        if created_to is not None:
+            query = query.where(Advertisement.created_at < created_to)
+        return query
+
     @authentication(is_auth=True)
+    @idempotent
     def post(self) -> Response:
         """Метод обработки HTTP-метода POST.
         Создает новую запись в базе данных об объявлении.
         """
-        validated_data: dict = validate(CreateAdvertisement, request.json)
+        validated_data: dict = validate(CreateAdvertisement, request.get_data())
+        partitions.ensure_current_partitions(
+            current_app.extensions["database"],
+            current_app.config["ADVERTISEMENT_PARTITIONS_AHEAD"],
+        )
         advertisement: Advertisement = Advertisement(**validated_data, user=request.user)
-        self.commit_changes(advertisement)
-        return self.get_response(advertisement.as_dict, 201)
+        self.flush_changes(advertisement)
+        payload: str = events.prepare(request.session, "created", advertisement)
+        with pipeline(request.session):
+            stats.advertisement_created(request.session, advertisement)
+            events.publish(request.session, payload)
+        response: Response = self.get_response(advertisement.as_dict, 201)
+        self.commit_changes(response=response)
+        return response
 
     @authentication(is_auth=True, is_owner=True)
     def patch(self, id: int) -> Response:
         """Метод обработки HTTP-метода PATCH.
         Частично меняет информацию о существующем объявлении в базе данных.
         """
-        validated_data: dict = validate(UpdateAdvertisement, request.json)
-        for adv in request.user.advertisements:
-            if adv.id == id:
-                advertisement: Advertisement = adv
-                break
+        validated_data: dict = validate(UpdateAdvertisement, request.get_data())
+        advertisement: Advertisement = self.get_obj(id)
         for field, value in validated_data.items():
             setattr(advertisement, field, value)
+        self.flush_changes(advertisement)
+        payload: str = events.prepare(request.session, "updated", advertisement)
+        with pipeline(request.session):
+            stats.advertisement_updated(request.session, advertisement)
+            events.publish(request.session, payload)
         self.commit_changes(advertisement)
         return self.get_response(advertisement.as_dict)
 
     @authentication(is_auth=True, is_owner=True)
     def delete(self, id: int) -> Response:
+        advertisement: Advertisement = self.get_obj(id)
+        payload: str = events.prepare(request.session, "deleted", advertisement)
+        with pipeline(request.session):
+            stats.advertisement_deleted(request.session, advertisement)
+            events.publish(request.session, payload)
         return super().delete(id)
 
 
-@app.route("/login", methods=["POST", "PATCH"])
+def advertisement_stream() -> Response:
+    """View-функция потока изменений объявлений в формате Server-Sent Events.
+
+    События created, updated и deleted доставляются после фиксации изменений.
+    Для возобновления потока клиент передает заголовок Last-Event-ID.
+    Подписка занимает поток воркера, поэтому их число в воркере ограничено
+    ADVERTISEMENT_STREAM_MAX_SUBSCRIBERS, сверх него возвращается 503 HTTP-ответ.
+    """
+    feed = events.get_feed(
+        current_app.extensions["database"],
+        buffer_size=current_app.config["ADVERTISEMENT_STREAM_BUFFER_SIZE"],
+    )
+    subscription = feed.subscribe(
+        request.headers.get("Last-Event-ID"),
+        max_subscribers=current_app.config["ADVERTISEMENT_STREAM_MAX_SUBSCRIBERS"],
+    )
+    if subscription is None:
+        response = error_handler(HttpError(503, "Too many stream subscribers, try again later"))
+        response.headers["Retry-After"] = "3"
+        return response
+    stream = events.stream_events(
+        feed,
+        subscription,
+        keepalive=current_app.config["ADVERTISEMENT_STREAM_KEEPALIVE"],
+        max_duration=current_app.config["ADVERTISEMENT_STREAM_MAX_DURATION"],
+    )
+    response = Response(stream_with_context(stream), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+def export_objects(name: str) -> Response:
+    """View-функция потоковой выгрузки всех пользователей или объявлений.
+
+    Формат задается параметром 'format': ndjson (по умолчанию) или csv.
+    """
+    export_format = request.args.get("format", "ndjson")
+    if export_format not in bulk.EXPORT_FORMATS:
+        formats = ", ".join(bulk.EXPORT_FORMATS)
+        raise HttpError(400, f"Query parameter 'format' must be one of {formats}")
+    rows = bulk.export_rows(current_app.extensions["database"], name, export_format)
+    response = Response(stream_with_context(rows), mimetype=bulk.EXPORT_FORMATS[export_format])
+    response.headers["Content-Disposition"] = f"attachment; filename={name}.{export_format}"
+    return response
+
+
+def sync_changes() -> Response:
+    """View-функция синхронизации клиентов (см. server.sync).
+
+    Возвращает измененных с момента 'since' пользователей и объявления,
+    идентификаторы удаленных и 'watermark' - значение 'since' для следующего запроса.
+    Без 'since' возвращает только 'watermark': после него клиент загружает
+    полную выгрузку (/user/export, /advertisement/export). Если записи об удалениях
+    после 'since' уже не хранятся, возвращается 410 HTTP-ответ.
+    """
+    since = _get_datetime_arg("since")
+    watermark: datetime = sync.get_watermark(request.session)
+    if since is None:
+        return jsonify({"watermark": watermark.isoformat()})
+    if since < watermark - timedelta(seconds=current_app.config["SYNC_TOMBSTONE_TTL"]):
+        raise HttpError(410, "Changes since this watermark are no longer available, export again")
+    watermark = max(watermark, since)
+    changes: dict = sync.get_changes(request.session, since, watermark)
+    return jsonify({"watermark": watermark.isoformat(), **changes})
+
+
+def profiling_sample() -> Response:
+    """View-функция снятия стеков потоков воркера (см. server.profiling).
+
+    Параметры: 'seconds' - длительность (по умолчанию 10, не больше PROFILING_MAX_SECONDS),
+    'interval' - период снимков в миллисекундах (по умолчанию 10).
+    Возвращает стеки в формате collapsed stacks и pid воркера в заголовке X-Worker-Pid.
+    """
+    profiling.check_token(request, current_app.config["PROFILING_TOKEN"])
+    seconds = _get_int_arg("seconds", 10, 1, current_app.config["PROFILING_MAX_SECONDS"])
+    interval = _get_int_arg("interval", 10, 1, 1000)
+    counts: dict[str, int] = profiling.sample(seconds, interval / 1000)
+    response = Response(profiling.format_collapsed(counts), mimetype="text/plain")
+    response.headers["X-Worker-Pid"] = str(os.getpid())
+    return response
+
+
+def profiling_profile(profile_id: str) -> Response:
+    """View-функция получения профиля запроса в формате pstats по X-Profile-Id."""
+    profiling.check_token(request, current_app.config["PROFILING_TOKEN"])
+    path: str = profiling.get_profile_path(current_app.config["PROFILING_DIR"], profile_id)
+    return send_file(
+        path, mimetype="application/octet-stream", download_name=f"{profile_id}.pstats"
+    )
+
+
+def user_stats(id: int) -> Response:
+    """View-функция получения статистики объявлений пользователя."""
+    if request.session.get(User, id) is None:
+        raise HttpError(404, f"User-model object with {id=} not found")
+    return jsonify(stats.get_stats(request.session, id))
+
+
 def login() -> Response:
     """View-функция авторизации.
 
@@ -184,9 +445,13 @@ def login() -> Response:
     """
     auth = request.authorization
     if auth and "username" in auth.parameters and "password" in auth.parameters:
-        query = sq.select(User).where(User.username == auth.parameters["username"])
-        user: User = request.session.scalar(query)
-        if bcrypt.check_password_hash(user.password, auth.parameters["password"]):
+        query = sq.select(User).where(
+            User.username == auth.parameters["username"], User.deletion_requested_at.is_(None)
+        )
+        user: User | None = request.session.scalar(query)
+        if user is None:
+            raise HttpError(401, "Invalid username or password")
+        if get_bcrypt().check_password_hash(user.password, auth.parameters["password"]):
             auth_token = encode_token(user)
         return jsonify(auth_token), 201
     raise HttpError(401, "Basic authorization credentials were not provided")
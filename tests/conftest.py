@@ -1,7 +1,7 @@
 import pytest
 
+from server import create_app
 from server.models import Session
-from server.routes import app
 from tests.utils import AdvertisementFactory, TestAPIClient, UserFactory
 
 
@@ -16,13 +16,13 @@ def session():
 
 @pytest.fixture(scope="session", autouse=True)
 def flask_app():
-    app.testing = True
+    app = create_app({"TESTING": True})
     yield app
 
 
 @pytest.fixture(scope="session")
-def client() -> TestAPIClient:
-    return TestAPIClient(app)
+def client(flask_app) -> TestAPIClient:
+    return TestAPIClient(flask_app)
 
 
 @pytest.fixture(scope="module")
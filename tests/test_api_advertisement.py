@@ -1,4 +1,21 @@
-from server.models import Advertisement
+import csv
+import io
+import json
+import uuid
+from datetime import datetime
+
+import pytest
+import sqlalchemy as sq
+
+from server.bulk import import_advertisements
+from server.events import get_feed
+from server.models import Advertisement, AdvertisementTitle
+from server.partitions import (
+    archive_partitions,
+    ensure_current_partitions,
+    ensure_partitions,
+    list_partitions,
+)
 from tests.utils import FlaskClient
 
 
@@ -129,3 +146,283 @@ def test_delete_authorized_success(adv_factory, client: FlaskClient):
     response = client.delete(url(adv.id), auth=client.token)
 
     assert response.status_code == 204
+
+
+def test_get_list_pagination(adv_factory, client: FlaskClient):
+    adv_factory(3)
+
+    response = client.get(url(), query_string={"limit": 2, "offset": 1})
+
+    assert response.status_code == 200
+    assert len(response.json) == 2
+    assert response.json[0]["id"] < response.json[1]["id"]
+    assert "X-Total-Count" not in response.headers
+
+
+def test_get_list_total_exact(adv_factory, client: FlaskClient):
+    adv_factory(2)
+
+    response = client.get(url(), query_string={"limit": 1, "total": "exact"})
+
+    assert response.status_code == 200
+    assert len(response.json) == 1
+    assert int(response.headers["X-Total-Count"]) >= 2
+    assert response.headers["X-Total-Count-Type"] == "exact"
+
+
+def test_get_list_total_estimated(adv_factory, client: FlaskClient):
+    adv_factory(2)
+
+    response = client.get(url(), query_string={"limit": 1, "total": "estimated"})
+
+    assert response.status_code == 200
+    assert int(response.headers["X-Total-Count"]) >= 0
+    assert response.headers["X-Total-Count-Type"] == "estimated"
+
+
+def test_get_list_fail_invalid_total(client: FlaskClient):
+    response = client.get(url(), query_string={"total": "everything"})
+
+    assert response.status_code == 400
+    assert response.json.get("error", None)
+
+
+@pytest.fixture
+def feed(flask_app):
+    feed = get_feed(flask_app.extensions["database"])
+    subscription = feed.subscribe()
+    assert feed.wait_until_listening(timeout=10)
+    yield subscription
+    feed.unsubscribe(subscription)
+
+
+def test_stream_receives_changes(feed, adv_factory, client: FlaskClient):
+    adv_data: dict = adv_factory(raw=True)
+    adv_data.pop("user", None)
+
+    id_adv = client.post(url(), json=adv_data, auth=client.token).json["id"]
+    client.patch(url(id_adv), json={"text": "Abrakadabra"}, auth=client.token)
+    client.delete(url(id_adv), auth=client.token)
+
+    events = [feed.queue.get(timeout=5) for _ in range(3)]
+    assert [event["event"] for event in events] == ["created", "updated", "deleted"]
+    assert {event["data"]["id"] for event in events} == {id_adv}
+    assert events[1]["data"]["text"] == "Abrakadabra"
+
+
+def test_stream_receives_large_advertisement(feed, adv_factory, client: FlaskClient):
+    adv_data: dict = adv_factory(raw=True, text="A" * 10000)
+    adv_data.pop("user", None)
+
+    id_adv = client.post(url(), json=adv_data, auth=client.token).json["id"]
+
+    event = feed.queue.get(timeout=5)
+    assert event["event"] == "created"
+    assert event["data"]["id"] == id_adv
+    assert event["data"]["text"] == adv_data["text"]
+
+
+def test_stream_resume_unknown_event(client: FlaskClient):
+    response = client.get(url("stream"), headers={"Last-Event-ID": "unknown"}, buffered=False)
+    chunks = iter(response.response)
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    assert next(chunks).startswith(b"retry:")
+    assert next(chunks).startswith(b"event: reset")
+    response.close()
+
+
+def test_stream_fail_too_many_subscribers(feed, flask_app, monkeypatch, client: FlaskClient):
+    monkeypatch.setitem(flask_app.config, "ADVERTISEMENT_STREAM_MAX_SUBSCRIBERS", 1)
+
+    response = client.get(url("stream"))
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"]
+    assert response.json.get("error", None)
+
+
+def test_export_ndjson_success(adv_factory, client: FlaskClient):
+    advs: list = adv_factory(2)
+
+    response = client.get(url("export"))
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    for adv in advs:
+        assert adv.as_dict in rows
+
+
+def test_export_csv_success(adv_factory, client: FlaskClient):
+    adv: Advertisement = adv_factory()
+
+    response = client.get(url("export"), query_string={"format": "csv"})
+
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert {**adv.as_dict, "id": str(adv.id), "id_user": str(adv.id_user)} in rows
+
+
+def test_import_advertisements(session, adv_factory, client: FlaskClient):
+    existed: Advertisement = adv_factory()
+    new_title: str = adv_factory(raw=True)["title"]
+    file = io.StringIO(
+        "username,title,text\n"
+        f"{client.user_dict['username']},{new_title},first\n"
+        f"{client.user_dict['username']},{new_title},duplicate\n"
+        f"{client.user_dict['username']},{existed.title},existed\n"
+        f"unknown-user,{adv_factory(raw=True)['title']},unknown\n"
+    )
+
+    loaded, skipped = import_advertisements(session, file)
+
+    assert (loaded, skipped) == (1, 3)
+    query = sq.select(Advertisement).where(Advertisement.title == new_title)
+    adv: Advertisement = session.scalar(query)
+    assert adv.id_user == client.user_dict["id"]
+    assert adv.text == "first"
+
+
+def test_post_fail_long_title(adv_factory, client: FlaskClient):
+    adv_data: dict = adv_factory(raw=True, title="A" * 51)
+    adv_data.pop("user", None)
+
+    response = client.post(url(), json=adv_data, auth=client.token)
+
+    assert response.status_code == 400
+    assert response.json["error"][0]["loc"] == ["title"]
+
+
+def test_post_fail_malformed_json(client: FlaskClient):
+    for _ in range(2):
+        response = client.post(url(), data=b'{"title": "', auth=client.token)
+
+        assert response.status_code == 400
+        assert response.json["error"][0]["type"] == "json_invalid"
+
+
+def test_post_fail_body_too_large(flask_app, client: FlaskClient):
+    text = "A" * flask_app.config["MAX_CONTENT_LENGTH"]
+
+    response = client.post(url(), json={"title": "Title", "text": text}, auth=client.token)
+
+    assert response.status_code == 413
+    assert response.json.get("error", None)
+
+
+def test_post_idempotent_replay(adv_factory, client: FlaskClient):
+    adv_data: dict = adv_factory(raw=True)
+    adv_data.pop("user", None)
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+
+    first = client.post(url(), json=adv_data, headers=headers, auth=client.token)
+    second = client.post(url(), json=adv_data, headers=headers, auth=client.token)
+
+    assert first.status_code == second.status_code == 201
+    assert first.json == second.json
+    assert second.headers["Idempotent-Replayed"] == "true"
+
+
+def test_post_authorized_fail_existed_title(adv_factory, client: FlaskClient):
+    adv: Advertisement = adv_factory()
+    adv_data: dict = adv_factory(raw=True, title=adv.title)
+    adv_data.pop("user", None)
+
+    response = client.post(url(), json=adv_data, auth=client.token)
+
+    assert response.status_code == 409
+    assert response.json.get("error", None)
+
+
+def test_get_list_created_period(adv_factory, client: FlaskClient):
+    adv: Advertisement = adv_factory()
+    created_at: str = adv.created_at.isoformat()
+
+    response_from = client.get(url(), query_string={"created_from": created_at})
+    response_to = client.get(url(), query_string={"created_to": created_at})
+
+    assert response_from.status_code == 200
+    assert adv.as_dict in response_from.json
+    assert response_to.status_code == 200
+    assert adv.as_dict not in response_to.json
+
+
+def test_get_list_fail_invalid_created_from(client: FlaskClient):
+    response = client.get(url(), query_string={"created_from": "yesterday"})
+
+    assert response.status_code == 400
+    assert response.json.get("error", None)
+
+
+def test_ensure_partitions(session):
+    ensure_partitions(session, 2)
+
+    assert ensure_partitions(session, 2) == 0
+    months = [month for _, month in list_partitions(session)]
+    current_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    assert current_month in months
+
+
+def test_ensure_current_partitions(flask_app, session):
+    database = flask_app.extensions["database"]
+    current_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    next_month = current_month.replace(
+        year=current_month.year + current_month.month // 12, month=current_month.month % 12 + 1
+    )
+
+    ensure_current_partitions(database, 0)
+
+    months = [month for _, month in list_partitions(session)]
+    assert current_month in months
+    assert next_month in months
+
+
+def test_select_by_id_reads_one_partition(session, adv_factory):
+    ensure_partitions(session, 2)
+    adv: Advertisement = adv_factory()
+    query = Advertisement.select_by_id(adv.id).compile(
+        dialect=session.get_bind().dialect, compile_kwargs={"literal_binds": True}
+    )
+
+    plan = session.scalars(sq.text(f"EXPLAIN (ANALYZE, COSTS OFF, TIMING OFF) {query}")).all()
+
+    scanned = [line for line in plan if " on \"Advertisement_" in line]
+    assert len(scanned) > 1
+    assert len([line for line in scanned if "never executed" not in line]) == 1
+    assert session.scalar(Advertisement.select_by_id(adv.id)) is adv
+
+
+def test_archive_partitions(flask_app, adv_factory, client: FlaskClient):
+    database = flask_app.extensions["database"]
+    title: str = adv_factory(raw=True)["title"]
+    with database.engine.begin() as connection:
+        connection.execute(
+            sq.select(sq.func.advertisement_create_partition(datetime(2001, 1, 1)))
+        )
+        connection.execute(
+            sq.insert(Advertisement).values(
+                id_user=client.user_dict["id"],
+                title=title,
+                text="archived",
+                created_at=datetime(2001, 1, 15),
+            )
+        )
+
+    try:
+        archived = list(archive_partitions(database, datetime(2001, 2, 1)))
+
+        assert archived == ["Advertisement_2001_01"]
+        with database() as session:
+            query = sq.select(Advertisement).where(Advertisement.title == title)
+            assert session.scalar(query) is None
+            archived_titles = session.scalars(
+                sq.text('SELECT title FROM archive."Advertisement_2001_01"')
+            )
+            assert archived_titles.all() == [title]
+            assert session.get(AdvertisementTitle, title) is None
+    finally:
+        with database.engine.begin() as connection:
+            connection.execute(sq.text('DROP TABLE IF EXISTS archive."Advertisement_2001_01"'))
+            connection.execute(sq.text('DROP TABLE IF EXISTS "Advertisement_2001_01"'))
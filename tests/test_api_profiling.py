@@ -0,0 +1,112 @@
+import pstats
+import threading
+import time
+
+import pytest
+
+from server import profiling
+from tests.utils import FlaskClient
+
+
+@pytest.fixture
+def profiling_enabled(flask_app, monkeypatch, tmp_path) -> dict:
+    monkeypatch.setitem(flask_app.config, "PROFILING_TOKEN", "secret")
+    monkeypatch.setitem(flask_app.config, "PROFILING_DIR", str(tmp_path))
+    return {"X-Profiling-Token": "secret"}
+
+
+def _busy_labelled_thread(stop: threading.Event) -> None:
+    with profiling.label("GET /busy", "view"):
+        while not stop.is_set():
+            time.sleep(0.001)
+
+
+def test_sample_fail_disabled(client: FlaskClient):
+    response = client.get("/profiling/sample", headers={"X-Profiling-Token": "secret"})
+
+    assert response.status_code == 404
+    assert response.json.get("error", None)
+
+
+def test_sample_fail_invalid_token(profiling_enabled, client: FlaskClient):
+    response = client.get("/profiling/sample", headers={"X-Profiling-Token": "invalid"})
+
+    assert response.status_code == 403
+    assert response.json.get("error", None)
+
+
+def test_sample_fail_invalid_seconds(profiling_enabled, client: FlaskClient):
+    response = client.get(
+        "/profiling/sample", query_string={"seconds": 3600}, headers=profiling_enabled
+    )
+
+    assert response.status_code == 400
+    assert response.json.get("error", None)
+
+
+def test_sample_success(profiling_enabled, client: FlaskClient):
+    stop = threading.Event()
+    thread = threading.Thread(target=_busy_labelled_thread, args=(stop,))
+    thread.start()
+    try:
+        response = client.get(
+            "/profiling/sample",
+            query_string={"seconds": 1, "interval": 5},
+            headers=profiling_enabled,
+        )
+    finally:
+        stop.set()
+        thread.join()
+
+    assert response.status_code == 200
+    assert response.headers["X-Worker-Pid"]
+    lines = response.get_data(as_text=True).splitlines()
+    busy = [line for line in lines if line.startswith("GET /busy;view;")]
+    assert busy
+    assert "_busy_labelled_thread" in busy[0]
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+def test_request_labels(adv_factory, monkeypatch, client: FlaskClient):
+    adv_id: int = adv_factory(user=client.user).id
+    labels: list[tuple[str, str]] = []
+    label = profiling.label
+
+    def recording_label(route: str | None = None, phase: str = "view"):
+        labels.append((route, phase))
+        return label(route, phase)
+
+    monkeypatch.setattr(profiling, "label", recording_label)
+
+    client.patch(f"/advertisement/{adv_id}", json={"text": "labelled"}, auth=client.token)
+
+    assert labels == [("PATCH /advertisement/<int:id>", "view"), (None, "auth")]
+
+
+def test_profile_request_success(profiling_enabled, tmp_path, client: FlaskClient):
+    response = client.get("/advertisement", headers={"X-Profile": "1", **profiling_enabled})
+
+    assert response.status_code == 200
+    profile_id = response.headers["X-Profile-Id"]
+
+    response = client.get(f"/profiling/profiles/{profile_id}", headers=profiling_enabled)
+
+    assert response.status_code == 200
+    path = tmp_path / "downloaded.pstats"
+    path.write_bytes(response.data)
+    functions = {function for _, _, function in pstats.Stats(str(path)).stats}
+    assert "_get_list_logic" in functions
+
+
+def test_profile_request_ignored_when_disabled(client: FlaskClient):
+    response = client.get("/advertisement", headers={"X-Profile": "1"})
+
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response.headers
+
+
+def test_profile_fail_not_found(profiling_enabled, client: FlaskClient):
+    response = client.get("/profiling/profiles/unknown", headers=profiling_enabled)
+
+    assert response.status_code == 404
+    assert response.json.get("error", None)
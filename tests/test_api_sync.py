@@ -0,0 +1,96 @@
+from datetime import datetime
+
+from werkzeug.datastructures import Authorization
+
+from server.permissions import encode_token
+from tests.utils import FlaskClient
+
+
+def test_sync_without_since_returns_watermark(client: FlaskClient):
+    response = client.get("/sync")
+
+    assert response.status_code == 200
+    assert list(response.json) == ["watermark"]
+    assert datetime.fromisoformat(response.json["watermark"]) <= datetime.now()
+
+
+def test_sync_success(session, user_factory, adv_factory, client: FlaskClient):
+    old_adv_id: int = adv_factory(user=client.user).id
+    session.commit()
+    watermark: str = client.get("/sync").json["watermark"]
+    user: dict = user_factory().as_dict
+    adv_data: dict = adv_factory(raw=True)
+    adv_data.pop("user", None)
+    session.commit()
+    new_adv: dict = client.post("/advertisement", json=adv_data, auth=client.token).json
+    client.delete(f"/advertisement/{old_adv_id}", auth=client.token)
+
+    response = client.get("/sync", query_string={"since": watermark})
+
+    assert response.status_code == 200
+    assert user in response.json["users"]
+    assert new_adv in response.json["advertisements"]
+    assert old_adv_id in response.json["deleted"]["advertisements"]
+    assert response.json["watermark"] > watermark
+
+    response = client.get("/sync", query_string={"since": response.json["watermark"]})
+
+    assert user not in response.json["users"]
+    assert new_adv not in response.json["advertisements"]
+    assert old_adv_id not in response.json["deleted"]["advertisements"]
+
+
+def test_sync_waits_for_open_transactions(session, adv_factory, client: FlaskClient):
+    # Чтение id после фиксации открывает транзакцию сессии теста.
+    adv_id: int = adv_factory(user=client.user).id
+    watermark: str = client.get("/sync").json["watermark"]
+
+    response = client.get("/sync", query_string={"since": watermark})
+
+    assert response.json["watermark"] == watermark
+    session.commit()
+    client.delete(f"/advertisement/{adv_id}", auth=client.token)
+    response = client.get("/sync", query_string={"since": watermark})
+
+    assert adv_id in response.json["deleted"]["advertisements"]
+
+
+def test_sync_updated_advertisement(session, adv_factory, client: FlaskClient):
+    adv_id: int = adv_factory(user=client.user).id
+    session.commit()
+    watermark: str = client.get("/sync").json["watermark"]
+
+    updated: dict = client.patch(
+        f"/advertisement/{adv_id}", json={"text": "updated"}, auth=client.token
+    ).json
+    response = client.get("/sync", query_string={"since": watermark})
+
+    assert updated in response.json["advertisements"]
+
+
+def test_sync_deleted_user(session, flask_app, user_factory, client: FlaskClient):
+    user = user_factory()
+    user_id: int = user.id
+    with flask_app.app_context():
+        token = Authorization(auth_type="token", token=encode_token(user)["auth_token"])
+    session.commit()
+    watermark: str = client.get("/sync").json["watermark"]
+
+    client.delete(f"/user/{user_id}", auth=token)
+    response = client.get("/sync", query_string={"since": watermark})
+
+    assert user_id in response.json["deleted"]["users"]
+
+
+def test_sync_fail_expired_since(client: FlaskClient):
+    response = client.get("/sync", query_string={"since": "2001-01-01"})
+
+    assert response.status_code == 410
+    assert response.json.get("error", None)
+
+
+def test_sync_fail_invalid_since(client: FlaskClient):
+    response = client.get("/sync", query_string={"since": "yesterday"})
+
+    assert response.status_code == 400
+    assert response.json.get("error", None)
@@ -1,6 +1,16 @@
+import io
 import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
-from server.models import User
+import sqlalchemy as sq
+from werkzeug.datastructures import Authorization
+
+from server import deletion, stats
+from server.bulk import import_users
+from server.models import Advertisement, IdempotencyKey, User
+from server.permissions import encode_token
+from server.schema import _errors_cache
 from tests.utils import FlaskClient
 
 
@@ -108,6 +118,65 @@ def test_delete_authorized_fail_not_owner(user_factory, client: FlaskClient):
     assert response.json.get("error", None)
 
 
+def _user_token(flask_app, user: User) -> Authorization:
+    with flask_app.app_context():
+        return Authorization(auth_type="token", token=encode_token(user)["auth_token"])
+
+
+def test_delete_success(session, flask_app, user_factory, adv_factory, client: FlaskClient):
+    user: User = user_factory()
+    adv: Advertisement = adv_factory(user=user)
+    user_id, adv_id = user.id, adv.id
+
+    response = client.delete(url(user_id), auth=_user_token(flask_app, user))
+
+    assert response.status_code == 204
+    session.expire_all()
+    assert session.get(User, user_id) is None
+    assert session.scalar(Advertisement.select_by_id(adv_id)) is None
+
+
+def test_delete_in_background(
+    session, flask_app, monkeypatch, user_factory, adv_factory, client: FlaskClient
+):
+    user_data: dict = user_factory(raw=True)
+    user: User = user_factory(**client.bcrypt.hash_password(user_data.copy()))
+    user_id = user.id
+    adv_factory(3, user=user)
+    stats.rebuild(session, [user_id])
+    session.commit()
+    token: Authorization = _user_token(flask_app, user)
+    monkeypatch.setitem(flask_app.config, "USER_DELETE_ASYNC_THRESHOLD", 2)
+    monkeypatch.setitem(flask_app.config, "USER_DELETE_CHUNK_SIZE", 2)
+    scheduled: list[int] = []
+    monkeypatch.setattr(deletion, "schedule", lambda database, id, chunk: scheduled.append(id))
+
+    response = client.delete(url(user_id), auth=token)
+
+    assert response.status_code == 202
+    assert scheduled == [user_id]
+    assert client.get(url(user_id)).status_code == 404
+    assert user.as_dict not in client.get(url()).json
+    assert client.get(url(user_id), auth=token).status_code == 401
+    assert client.post("/login", auth=tuple(user_data.values())).status_code == 401
+
+    result = flask_app.test_cli_runner().invoke(args=["users", "delete-pending"])
+
+    assert "Deleted 1 users" in result.output
+    session.expire_all()
+    assert session.get(User, user_id) is None
+    query = sq.select(sq.func.count()).where(Advertisement.id_user == user_id)
+    assert session.scalar(query) == 0
+
+
+def test_delete_in_background_skips_unmarked_user(flask_app, user_factory):
+    user: User = user_factory()
+
+    future = deletion.schedule(flask_app.extensions["database"], user.id, 10)
+
+    assert future.result(timeout=10) is False
+
+
 def test_login_success(user_factory, client: FlaskClient):
     user_data: dict = user_factory(raw=True)
     user_factory(**client.bcrypt.hash_password(user_data.copy()))
@@ -125,3 +194,118 @@ def test_fail_invalid_token(client: FlaskClient):
 
     assert response.status_code == 401
     assert response.json.get("error", None)
+
+
+def test_get_stats_success(adv_factory, client: FlaskClient):
+    stats_url = f"{url(client.user_dict['id'])}/stats"
+    count_before = client.get(stats_url).json["advertisements_count"]
+    adv_data: dict = {"title": adv_factory(raw=True)["title"], "text": "Abrakadabra"}
+
+    id_adv = client.post("/advertisement", json=adv_data, auth=client.token).json["id"]
+    response = client.get(stats_url)
+
+    assert response.status_code == 200
+    assert response.json["advertisements_count"] == count_before + 1
+    assert response.json["last_posted_at"]
+
+    client.delete(f"/advertisement/{id_adv}", auth=client.token)
+    response = client.get(stats_url)
+
+    assert response.json["advertisements_count"] == count_before
+
+
+def test_get_stats_fail_not_found(client: FlaskClient):
+    response = client.get(f"{url(10**9)}/stats")
+
+    assert response.status_code == 404
+    assert response.json.get("error", None)
+
+
+def test_import_users(session, user_factory, client: FlaskClient):
+    username: str = user_factory(raw=True)["username"]
+    password: str = client.bcrypt.generate_password_hash("QWErty123").decode()
+    file = io.StringIO(
+        "username,password\n"
+        f"{username},{password}\n"
+        f"{client.user_dict['username']},{password}\n"
+        f"{'x' * 51},{password}\n"
+        f"{user_factory(raw=True)['username']},QWErty123\n"
+    )
+
+    loaded, skipped = import_users(session, file)
+
+    assert (loaded, skipped) == (1, 3)
+    user: User = session.scalar(sq.select(User).where(User.username == username))
+    assert user.password == password
+
+
+def test_post_fail_long_name(user_factory, client: FlaskClient):
+    user_data: dict = user_factory(raw=True, username="a" * 51)
+
+    response = client.post(url(), json=user_data)
+
+    assert response.status_code == 400
+    assert response.json["error"][0]["loc"] == ["username"]
+
+
+def test_post_idempotent_replay(user_factory, client: FlaskClient):
+    user_data: dict = user_factory(raw=True)
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+
+    first = client.post(url(), json=user_data, headers=headers)
+    second = client.post(url(), json=user_data, headers=headers)
+
+    assert first.status_code == second.status_code == 201
+    assert first.json == second.json
+    assert second.headers["Idempotent-Replayed"] == "true"
+
+
+def test_post_idempotent_fail_other_body(user_factory, client: FlaskClient):
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+
+    client.post(url(), json=user_factory(raw=True), headers=headers)
+    response = client.post(url(), json=user_factory(raw=True), headers=headers)
+
+    assert response.status_code == 422
+    assert response.json.get("error", None)
+
+
+def test_post_idempotent_concurrent(flask_app, user_factory):
+    user_data: dict = user_factory(raw=True)
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+
+    def post(_):
+        return flask_app.test_client().post(url(), json=user_data, headers=headers)
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        responses = list(executor.map(post, range(3)))
+
+    assert [response.status_code for response in responses] == [201] * 3
+    assert len({response.json["id"] for response in responses}) == 1
+    assert sum("Idempotent-Replayed" in response.headers for response in responses) == 2
+
+
+def test_post_idempotent_fail_anonymous_key_not_uuid(user_factory, client: FlaskClient):
+    response = client.post(url(), json=user_factory(raw=True), headers={"Idempotency-Key": "1"})
+
+    assert response.status_code == 400
+    assert response.json.get("error", None)
+
+
+def test_post_idempotent_not_stored_on_conflict(session, user_factory, client: FlaskClient):
+    key: str = uuid.uuid4().hex
+    user_data: dict = user_factory(raw=True, username=client.user_dict["username"])
+
+    response = client.post(url(), json=user_data, headers={"Idempotency-Key": key})
+
+    assert response.status_code == 409
+    assert session.scalar(sq.select(IdempotencyKey).where(IdempotencyKey.key == key)) is None
+
+
+def test_post_fail_simple_password_not_cached(user_factory, client: FlaskClient):
+    user_data: dict = user_factory(raw=True, password="simple")
+
+    response = client.post(url(), json=user_data)
+
+    assert response.status_code == 400
+    assert not any(b"simple" in body for _, body in _errors_cache)
@@ -4,7 +4,6 @@ from werkzeug.datastructures import Authorization
 
 from server.models import Advertisement, Session, User
 from server.permissions import encode_token
-from server.routes import app
 from server.security import AppBcrypt
 
 
@@ -19,7 +18,7 @@ class UserFactory(factory.alchemy.SQLAlchemyModelFactory):
 
 
 class AdvertisementFactory(factory.alchemy.SQLAlchemyModelFactory):
-    title: str = factory.Faker("sentence", variable_nb_words=False)
+    title: str = factory.Faker("text", max_nb_chars=50)
     text: str = factory.Faker("paragraph", nb_sentences=10)
     user: User = factory.SubFactory(UserFactory)
 
@@ -31,15 +30,16 @@ class AdvertisementFactory(factory.alchemy.SQLAlchemyModelFactory):
 
 class TestAPIClient(FlaskClient):
     def __init__(self, *args, **kwargs):
-        self.bcrypt = AppBcrypt(app=app)
+        super().__init__(*args, **kwargs)
+        self.bcrypt = AppBcrypt(app=self.application)
         self._user_data: dict = UserFactory.stub().__dict__
         self.user: User = UserFactory.create(**self.bcrypt.hash_password(self._user_data.copy()))
 
         self.user_dict: dict = self.user.as_dict
 
         self.invalid_token: Authorization = Authorization(auth_type="token", token="invalid-token")
-        self.token: Authorization = Authorization(
-            auth_type="token",
-            token=encode_token(self.user)["auth_token"],
-        )
-        super().__init__(*args, **kwargs)
+        with self.application.app_context():
+            self.token: Authorization = Authorization(
+                auth_type="token",
+                token=encode_token(self.user)["auth_token"],
+            )
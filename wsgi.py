@@ -1,4 +1,6 @@
-from runserver import app
+from server import create_app
+
+app = create_app()
 
 if __name__ == "__main__":
     app.run()